@@ -1,72 +1,395 @@
 import os
+import errno
+import fcntl
+import select
+import signal
+import time
+from collections import deque, defaultdict, OrderedDict
+from multiprocessing.pool import ThreadPool
 
 opj = os.path.join
 from ..util.helpers import mkdir
+from ..util.stats import Histogram
 from .local import DRM_Local
 from .lsf import DRM_LSF
 from .ge import DRM_GE
+from .pool import DRM_Pool
+from .sim import DRM_Sim
+from .results import ResultChannel
 from .. import TaskStatus, StageStatus, ExecutionStatus, NOOP
+from ..models.Task import set_task_statuses
 import itertools as it
 from operator import attrgetter
 
 
+class RunningTasks(object):
+    """
+    The Tasks that have been submitted to a DRM and have not finished yet, indexed by drm.  Adding and removing a Task
+    is O(1).
+    """
+
+    def __init__(self):
+        self._by_drm = defaultdict(OrderedDict)  # drm -> {task: None}, in the order they were submitted
+
+    def __len__(self):
+        return sum(len(tasks) for tasks in self._by_drm.values())
+
+    def __iter__(self):
+        for tasks in self._by_drm.values():
+            for task in tasks:
+                yield task
+
+    def __contains__(self, task):
+        return task in self._by_drm.get(task.drm, ())
+
+    def add(self, task):
+        self._by_drm[task.drm][task] = None
+
+    def remove(self, task):
+        del self._by_drm[task.drm][task]
+
+    def drms(self):
+        """
+        :returns: The drms with running Tasks.
+        """
+        return [drm for drm, tasks in self._by_drm.items() if tasks]
+
+    def by_drm(self):
+        """
+        :returns: [(drm, [task, ...]), ...] for each drm with running Tasks.
+        """
+        return [(drm, list(tasks)) for drm, tasks in self._by_drm.items() if tasks]
+
+
 class JobManager(object):
-    def __init__(self, get_submit_args, default_queue=None):
+    #: Longest time :meth:`wait_for_finished_tasks` blocks when only event pushing DRMs have running tasks
+    event_timeout = 10
+
+    #: The most submission commands (ie. bsub or qsub) that are run at once
+    max_concurrent_submissions = 16
+
+    #: Seconds to wait for a finished job's result to arrive in the spool directory, before reading its profile.json
+    result_timeout = 60
+
+    def __init__(self, get_submit_args, default_queue=None, array_jobs=False, bundles=None, result_dir=None):
         self.drms = dict(local=DRM_Local(self))  # always support local execution
         self.drms['lsf'] = DRM_LSF(self)
         self.drms['ge'] = DRM_GE(self)
+        self.drms['pool'] = DRM_Pool(self)
+        self.drms['sim'] = DRM_Sim(self)
 
         self.local_drm = DRM_Local(self)
-        self.running_tasks = []
+        self.running_tasks = RunningTasks()
+        self._finished_noops = deque()
+        self._failed_submissions = deque()  # Tasks whose submission command failed
         self.get_submit_args = get_submit_args
         self.default_queue = default_queue
+        #: If True, DRMs that support it submit ready Tasks of the same stage with the same submit args as one array job
+        self.array_jobs = array_jobs
+        #: stage name -> dict(size=, time_req=, parallel=) of the stages whose ready Tasks are bundled into one job
+        self.bundles = {name: opts if isinstance(opts, dict) else dict(size=opts)
+                        for name, opts in (bundles or dict()).items()}
+        self._bundles = dict()  # bundle leader -> the other Tasks in its bundle
+        self._bundle_scripts = dict()  # bundle leader -> the script its job runs
 
+        # Finished tasks pushed by DRMs.  deque.append is atomic, so DRMs may push from other threads.  A byte is
+        # written to the wakeup pipe for each push so the scheduler can block on it with select().  The pipe is opened
+        # by the first submission, so JobManagers that never submit anything (ie. in the web interface) don't use fds
+        self._pushed_finished = deque()
+        self._wakeup_r = self._wakeup_w = None
+        self._last_polled = dict()
+
+        #: Receives the profiles that jobs push when they finish, see :attr:`DRM.result_channel`
+        self.results = ResultChannel(result_dir)
+        self._awaiting_results = OrderedDict()  # finished job's task -> when to stop waiting for its results
+
+        self._submit_pool = None
+        #: drm name -> Histogram of the seconds it took to submit each job
+        self.submit_latency = defaultdict(Histogram)
+        #: drm name -> Histogram of the seconds each :meth:`DRM.filter_is_done` poll took
+        self.poll_latency = defaultdict(Histogram)
+
+    @property
+    def submit_pool(self):
+        """Threads that DRMs run their submission and cancellation commands in, shared by all DRMs"""
+        if self._submit_pool is None:
+            self._submit_pool = ThreadPool(self.max_concurrent_submissions)
+        return self._submit_pool
 
     def submit(self, task):
-        self.running_tasks.append(task)
-        task.status = TaskStatus.waiting
-
-        command = task.tool._generate_command(task)
-
-        if command == NOOP:
-            task.NOOP = True
-            task.status = TaskStatus.submitted
-        else:
-            mkdir(task.log_dir)
-            self._create_command_sh(task, command)
-            task.drm_native_specification = self.get_submit_args(task, default_queue=self.default_queue)
-            assert task.drm is not None, 'task has no drm set'
-            self.drms[task.drm].submit_job(task)
-            task.status = TaskStatus.submitted
+        self.submit_tasks([task])
+
+    def submit_tasks(self, tasks):
+        """
+        Submits `tasks`.  Each DRM gets all of its Tasks at once, so it can submit them concurrently.
+        """
+        if self._wakeup_r is None:
+            self._wakeup_r, self._wakeup_w = os.pipe()
+            for fd in [self._wakeup_r, self._wakeup_w]:
+                fcntl.fcntl(fd, fcntl.F_SETFL, fcntl.fcntl(fd, fcntl.F_GETFL) | os.O_NONBLOCK)
+        set_task_statuses(tasks, TaskStatus.waiting)
+        to_submit = []
+        for task in tasks:
+            # chunked Execution.adds render the command up front, since the Tool is not kept around
+            command = task.command if task.command is not None else task.tool._generate_command(task)
+
+            if command == NOOP:
+                task.NOOP = True
+                self._finished_noops.append(task)
+            else:
+                mkdir(task.log_dir)
+                self._create_command_sh(task, command)
+                task.drm_native_specification = self.get_submit_args(task, default_queue=self.default_queue)
+                assert task.drm is not None, 'task has no drm set'
+                to_submit.append(task)
+
+        if self.bundles:
+            to_submit = self._make_bundles(to_submit)
+        for task in to_submit:
+            self.running_tasks.add(task)
+
+        f = attrgetter('drm')
+        failed, unsubmitted = dict(), set()
+        for drm, drm_tasks in it.groupby(sorted(to_submit, key=f), f):
+            failed.update(self.drms[drm].submit_jobs(list(drm_tasks)))
+        for task in to_submit:
+            if task in failed:
+                # reported as finished without an exit_status, so it fails (and may be retried) like any other Task
+                self.running_tasks.remove(task)
+                self._bundle_scripts.pop(task, None)
+                for t in [task] + self._bundles.pop(task, []):
+                    with open(t.output_stderr_path, 'w') as f:
+                        f.write('Failed to submit the job: %s\n' % failed[task])
+                    t.exit_status = None
+                    self._failed_submissions.append(t)
+                    unsubmitted.add(t)
+                continue
+            for member in self._bundles.get(task, ()):
+                member.drm_jobID, member.drm_array_index = task.drm_jobID, task.drm_array_index
+        set_task_statuses([t for t in tasks if t not in unsubmitted], TaskStatus.submitted)
+
+    def _make_bundles(self, tasks):
+        """
+        Groups the Tasks of each stage in :attr:`bundles` into bundles of at most `size` Tasks, or at most a summed
+        `time_req`.  A bundle is submitted as one job of its first Task, the leader, which runs the command.bash of
+        every member under psprofile, `parallel` at a time (but no more than the leader's cpu_req).  Since every
+        member writes its own profile, they are still finished individually.
+
+        :returns: (list) The Tasks to submit: bundle leaders and Tasks that aren't bundled.
+        """
+        to_submit = []
+        f = lambda t: (t.drm, t.stage.id)
+        for (drm, _), group in it.groupby(sorted(tasks, key=f), f):
+            group = list(group)
+            opts = self.bundles.get(group[0].stage.name)
+            # DRMs that don't profile jobs can't report on each member
+            if opts is None or not self.drms[drm].profiles_jobs:
+                to_submit += group
+                continue
+            for bundle in _split_bundle(group, opts.get('size'), opts.get('time_req')):
+                leader = bundle[0]
+                if len(bundle) > 1:
+                    lanes = max(1, min(opts.get('parallel', 1), leader.cpu_req))
+                    self._bundle_scripts[leader] = self._create_bundle_sh(bundle, lanes)
+                    self._bundles[leader] = bundle[1:]
+                    # the job has to last as long as its longest lane, and hold the memory of a Task in every lane
+                    leader.drm_native_specification = self.get_submit_args(
+                        _BundleJob(leader, bundle, lanes), default_queue=self.default_queue)
+                to_submit.append(leader)
+        return to_submit
+
+    def job_output_paths(self, task):
+        """
+        :returns: (stdout path, stderr path) that the DRM sends the output of `task`'s job to.  A bundle's job gets its
+            own, since its script sends the output of each member, the leader included, to the member's files.
+        """
+        if task in self._bundle_scripts:
+            base = os.path.splitext(self._bundle_scripts[task])[0]
+            return base + '_stdout.txt', base + '_stderr.txt'
+        return task.output_stdout_path, task.output_stderr_path
+
+    def _create_bundle_sh(self, bundle, lanes):
+        """
+        Creates a script that runs the Tasks of `bundle`, with its members dealt round robin into `lanes` that run in
+        parallel.
+
+        :returns: (str) The path of the script.
+        """
+        leader = bundle[0]
+        path = opj(os.path.dirname(leader.log_dir), 'bundle_task{0.id}_attempt{0.attempt}.bash'.format(leader))
+        with open(path, 'wb') as f:
+            f.write('#!/bin/bash\n'
+                    '# %s tasks in %s lanes\n' % (len(bundle), lanes))
+            for lane in range(lanes):
+                f.write('(\n')
+                for task in bundle[lane::lanes]:
+                    f.write('{{ {cmd_str}; }} > "{stdout}" 2> "{stderr}"\n'.format(
+                        cmd_str=self.get_command_str(task), stdout=task.output_stdout_path,
+                        stderr=task.output_stderr_path))
+                f.write(') &\n')
+            f.write('wait\n')
+        os.chmod(path, 0700)
+        return path
+
 
     def terminate(self):
-        f = lambda t: t.drm
-        for drm, tasks in it.groupby(sorted(self.running_tasks, key=f), f):
-            tasks = list(tasks)
+        for drm, tasks in self.running_tasks.by_drm():
             self.drms[drm].kill_tasks(tasks)
-            for task in tasks:
-                task.status = TaskStatus.killed
-                task.stage.status = StageStatus.killed
+            tasks += [member for task in tasks for member in self._bundles.get(task, ())]
+            set_task_statuses(tasks, TaskStatus.killed)
+            for stage in set(task.stage for task in tasks):
+                stage.status = StageStatus.killed
+        if self._awaiting_results:
+            tasks = [t for task in self._awaiting_results for t in [task] + self._bundles.get(task, [])]
+            set_task_statuses(tasks, TaskStatus.killed)
+        self.close()
+
+    def close(self):
+        """
+        Stops the threads of the submission pool, once the commands running in it have finished, and closes the wakeup
+        pipe.  Safe to call more than once.
+        """
+        if self._submit_pool is not None:
+            self._submit_pool.close()
+            self._submit_pool.join()
+            self._submit_pool = None
+        if self._wakeup_r is not None:
+            try:
+                # stop signals from being written to the pipe's fd once it's closed, and maybe reused
+                old_fd = signal.set_wakeup_fd(-1)
+                if old_fd != self._wakeup_w:
+                    signal.set_wakeup_fd(old_fd)
+            except ValueError:
+                # not the main thread, where the wakeup fd can't have been set either
+                pass
+            os.close(self._wakeup_r)
+            os.close(self._wakeup_w)
+            self._wakeup_r = self._wakeup_w = None
 
 
+    def push_finished(self, task):
+        """
+        Called by DRMs that can push events when `task`'s job has finished.  Safe to call from another thread.
+        """
+        self._pushed_finished.append(task)
+        if self._wakeup_w is None:
+            # closed, so nothing is waiting anymore (ie. a killed job that exited after the run ended)
+            return
+        try:
+            os.write(self._wakeup_w, '.')
+        except OSError as e:
+            # a full pipe means the scheduler has plenty of wakeups pending already
+            if e.errno != errno.EAGAIN:
+                raise
+
+    @property
+    def poll_timeout(self):
+        """
+        How long the scheduler may block waiting for events before a DRM that cannot push events needs polling
+        """
+        polled_drms = {drm for drm in self.running_tasks.drms() if not self.drms[drm].pushes_events}
+        timeouts = [self.drms[drm].poll_interval for drm in polled_drms]
+        if self._awaiting_results:
+            timeouts.append(self.results.scan_interval)
+        return min(timeouts or [self.event_timeout])
+
+    def wait_for_finished_tasks(self, timeout):
+        """
+        Blocks until a DRM pushes a finished task, a job delivers its result, or `timeout` seconds have passed.
+        """
+        wakeup_fds = [self._wakeup_r] if self._wakeup_r is not None else []
+        if not self._pushed_finished:
+            try:
+                select.select(wakeup_fds + self.results.fds(), [], [], timeout)
+            except select.error as e:
+                # a signal (ie SIGINT) arrived
+                if e.args[0] != errno.EINTR:
+                    raise
+        try:
+            for fd in wakeup_fds:
+                while os.read(fd, 4096):
+                    pass
+        except OSError as e:
+            if e.errno != errno.EAGAIN:
+                raise
+        self.results.collect()
+
     def get_finished_tasks(self):
         """
         :returns: A completed task, or None if there are no tasks to wait for
         """
-        for t in list(self.running_tasks):
-            if t.NOOP:
-                self.running_tasks.remove(t)
-                yield t
-        f = attrgetter('drm')
-        for drm, tasks in it.groupby(sorted(self.running_tasks, key=f), f):
-            for t in self.drms[drm].filter_is_done(list(tasks)):
-                self.running_tasks.remove(t)
-                try:
-                    t.update_from_profile_output()
-                except IOError as e:
-                    t.log.info(e)
-                    t.execution.status = ExecutionStatus.failed
-                yield t
+        while self._finished_noops:
+            yield self._finished_noops.popleft()
+
+        while self._failed_submissions:
+            yield self._failed_submissions.popleft()
+
+        while self._pushed_finished:
+            t = self._pushed_finished.popleft()
+            if t in self.running_tasks:
+                self._job_finished(t)
+
+        # Polling fallback for DRMs that cannot push events
+        now = time.time()
+        for drm, tasks in self.running_tasks.by_drm():
+            drm = self.drms[drm]
+            if drm.pushes_events or now - self._last_polled.get(drm.name, 0) < drm.poll_interval:
+                continue
+            self._last_polled[drm.name] = now
+            done = drm.filter_is_done(tasks)
+            self.poll_latency[drm.name].add(time.time() - now)
+            for t in done:
+                self._job_finished(t)
+
+        # Jobs deliver their results just before they exit, but results in the spool directory may take a while to
+        # show up on a shared filesystem
+        if self._awaiting_results:
+            self.results.collect(scan=True)
+            now = time.time()
+            for task, deadline in self._awaiting_results.items():
+                if now >= deadline or all(t.id in self.results.results
+                                          for t in [task] + self._bundles.get(task, [])):
+                    del self._awaiting_results[task]
+                    for finished in self._results_arrived(task):
+                        yield finished
+
+    def _job_finished(self, task):
+        """
+        Called when the DRM reports that `task`'s job has finished.  It's processed once the results of its Tasks
+        have arrived, or once it's clear they won't.
+        """
+        self.running_tasks.remove(task)
+        channel = self.drms[task.drm].result_channel
+        timeout = self.result_timeout if channel == 'spool' and self.results.spool_dir is not None else 0
+        self._awaiting_results[task] = time.time() + timeout
+
+    def _results_arrived(self, task):
+        """
+        :returns: (list) `task`, and the members of its bundle if it leads one.
+        """
+        members = self._bundles.pop(task, None)
+        if members is None:
+            return [self._finished(task)]
+        del self._bundle_scripts[task]
+        # the DRM's usage of a bundle's job is the whole bundle's, so only the member's own profiles are used
+        return [self._finished(t, drm_usage=False) for t in [task] + members]
+
+    def _finished(self, task, drm_usage=True):
+        task.exit_status = None
+        if self.drms[task.drm].profiles_jobs:
+            # without a delivered result, the profile is read from profile.json
+            task._cache_profile = self.results.results.pop(task.id, None)
+            try:
+                task.update_from_profile_output()
+            except IOError as e:
+                task.log.info(e)
+                task.execution.status = ExecutionStatus.failed
+        # usage the DRM collected itself covers the job's whole process tree, and is there even if it wasn't profiled
+        usage = self.drms[task.drm].job_usage(task)
+        if drm_usage:
+            for k, v in usage.items():
+                setattr(task, k, v)
+        return task
 
     def _create_command_sh(self, task, command):
         """Create a sh script that will execute a command"""
@@ -76,14 +399,54 @@ class JobManager(object):
                     'set -o pipefail\n'
                     '\n'
                     + command + "\n")
-        os.system('chmod 700 "{0}"'.format(task.output_command_script_path))
+        os.chmod(task.output_command_script_path, 0700)
 
     def get_command_str(self, task):
         "The command to be stored in the command.sh script"
+        if task in self._bundle_scripts:
+            return self._bundle_scripts[task]
         p = "psprofile{skip_profile} -w 100 -o {profile_out} {command_script_path}".format(
             profile_out=task.output_profile_path,
             command_script_path=task.output_command_script_path,
             skip_profile=' --skip_profile' if task.skip_profile else ''
         )
+        channel = self.drms[task.drm].result_channel
+        deliver = channel and self.results.deliver_command(task, channel)
+        if deliver:
+            p += '; ' + deliver
         return p
 
+
+
+class _BundleJob(object):
+    """
+    Stands in for the leader of a bundle when its submit args are generated, with the resource requirements of the
+    whole bundle: the time_req of its longest lane, and the memory of the Tasks that need the most in each lane
+    running at once.  Everything else is the leader's.
+    """
+
+    def __init__(self, leader, bundle, lanes):
+        self._leader = leader
+        time_reqs = [t.time_req for t in bundle]
+        self.time_req = None if None in time_reqs else max(sum(time_reqs[lane::lanes]) for lane in range(lanes))
+        mem_reqs = sorted((t.mem_req for t in bundle if t.mem_req), reverse=True)
+        self.mem_req = sum(mem_reqs[:lanes]) or None
+
+    def __getattr__(self, name):
+        return getattr(self._leader, name)
+
+
+def _split_bundle(tasks, size=None, time_req=None):
+    """
+    Splits `tasks` into bundles of at most `size` Tasks, whose time_reqs sum to at most `time_req`.  A Task is never
+    left out, so one with a bigger time_req than `time_req` is bundled by itself.
+    """
+    bundle, total = [], 0
+    for task in tasks:
+        if bundle and ((size and len(bundle) >= size) or (time_req and total + (task.time_req or 0) > time_req)):
+            yield bundle
+            bundle, total = [], 0
+        bundle.append(task)
+        total += task.time_req or 0
+    if bundle:
+        yield bundle
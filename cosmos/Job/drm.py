@@ -1,16 +1,153 @@
+import os
+import time
+import subprocess as sp
+import itertools as it
+import re
+
+from ..util.iterstuff import chunked
+
+opj = os.path.join
+
+
 class DRM(object):
     "DRM base class"
     name = None
 
+    #: If True, the DRM calls :meth:`JobManager.push_finished` when a job finishes instead of being polled with
+    #: :meth:`filter_is_done`.
+    pushes_events = False
+
+    #: Seconds between :meth:`filter_is_done` polls, for DRMs that cannot push events.
+    poll_interval = .3
+
+    #: If False, jobs are not run under psprofile, and their profile fields only come from :meth:`job_usage`.
+    profiles_jobs = True
+
+    #: How jobs push their profile to the JobManager's :class:`ResultChannel` when they finish: 'socket' for jobs that
+    #: run on this machine, 'spool' for jobs that share a filesystem with it, or None to read their profile.json.
+    result_channel = None
+
+    #: If True, the DRM implements :meth:`submit_array_command`.
+    supports_array_jobs = False
+
+    #: The most Tasks submitted in one array job.
+    max_array_size = 1000
+
+    #: Matches the job name option in a drm_native_specification, which array jobs replace with their own.
+    job_name_option_re = None
+
+    #: The most jobs cancelled by one :meth:`kill_command`.
+    kill_batch_size = 500
+
     def __init__(self, jobmanager):
         self.jobmanager = jobmanager
 
     def submit_job(self, task):
+        """
+        Submits `task` and sets its drm_jobID.
+        """
+        self.submit_jobs([task])
+
+    def submit_jobs(self, tasks):
+        """
+        Submits `tasks` and sets their drm_jobIDs.  By default the commands from :meth:`submit_command` are run
+        concurrently in the JobManager's submission pool.  The Tasks themselves are only touched in the calling
+        thread.
+
+        If the JobManager has array_jobs turned on and the DRM supports them, Tasks of the same stage with the same
+        submit args are submitted together as one array job.
+
+        :returns: (dict) Task -> the exception its submission failed with, for the Tasks that could not be submitted.
+            The others are submitted even if some fail, so their jobs aren't left running unbeknownst to the
+            JobManager.
+        """
+        jobs = []  # [(tasks, submission command), ...]
+        if self.jobmanager.array_jobs and self.supports_array_jobs:
+            f = lambda t: (t.stage.id, self.array_native_specification(t))
+            for _, group in it.groupby(sorted(tasks, key=f), f):
+                for array in chunked(group, self.max_array_size):
+                    if len(array) > 1:
+                        jobs.append((array, self.submit_array_command(array, self._create_array_dispatcher(array))))
+                    else:
+                        jobs.append((array, self.submit_command(array[0])))
+        else:
+            jobs = [([task], self.submit_command(task)) for task in tasks]
+
+        results = self.jobmanager.submit_pool.map_async(_run_submit_command, [cmd for _, cmd in jobs]).get(2 ** 31)
+
+        failed = dict()
+        for (job_tasks, _), (out, latency, error) in zip(jobs, results):
+            self.jobmanager.submit_latency[self.name].add(latency)
+            if error is None:
+                drm_jobID = self.parse_job_id(out)
+                for i, task in enumerate(job_tasks):
+                    task.drm_jobID = drm_jobID
+                    task.drm_array_index = i + 1 if len(job_tasks) > 1 else None
+            else:
+                for task in job_tasks:
+                    task.log.error('Failed to submit %s: %s' % (task, error))
+                    failed[task] = error
+        return failed
+
+    def submit_command(self, task):
+        """
+        :returns: (str) A shell command that submits `task`, whose output :meth:`parse_job_id` parses.
+        """
+        raise NotImplementedError
+
+    def submit_array_command(self, tasks, dispatcher_path):
+        """
+        :param dispatcher_path: A script that runs the Task of the array element it is started as.
+        :returns: (str) A shell command that submits `tasks` as one array job, whose output :meth:`parse_job_id`
+            parses.
+        """
         raise NotImplementedError
 
+    def array_native_specification(self, task):
+        """
+        :returns: (str) `task`'s drm_native_specification without the per-task job name, which Tasks submitted in the
+            same array job must share.
+        """
+        ns = task.drm_native_specification or ''
+        return re.sub(self.job_name_option_re, '', ns) if self.job_name_option_re else ns
+
+    def parse_job_id(self, out):
+        """
+        :returns: (int) The job ID in the output of a :meth:`submit_command`.
+        """
+        raise NotImplementedError
+
+    def _create_array_dispatcher(self, tasks):
+        """
+        Writes a script that maps the array element index ($LSB_JOBINDEX or $SGE_TASK_ID) to the command of the
+        corresponding Task, redirecting its output to the Task's stdout and stderr files.
+
+        :returns: (str) The path of the script.
+        """
+        path = opj(os.path.dirname(tasks[0].log_dir),
+                   'array_task{0.id}_attempt{0.attempt}.bash'.format(tasks[0]))
+        with open(path, 'wb') as f:
+            f.write('#!/bin/bash\n'
+                    'case "${LSB_JOBINDEX:-$SGE_TASK_ID}" in\n')
+            for i, task in enumerate(tasks):
+                f.write('    {i}) {{ {cmd_str}; }} > "{stdout}" 2> "{stderr}" ;;\n'.format(
+                    i=i + 1, cmd_str=self.jobmanager.get_command_str(task),
+                    stdout=task.output_stdout_path, stderr=task.output_stderr_path))
+            f.write('    *) echo "no task for array index $LSB_JOBINDEX$SGE_TASK_ID" >&2; exit 1 ;;\n'
+                    'esac\n')
+        os.chmod(path, 0700)
+        return path
+
     def filter_is_done(self, tasks):
         raise NotImplementedError
 
+    def job_usage(self, task):
+        """
+        :returns: (dict) profile fields (ie. exit_status or max_rss_mem_kb) the DRM collected itself when `task`'s job
+            finished.
+        """
+        return dict()
+
     def drm_statuses(self, tasks):
         raise NotImplementedError
 
@@ -20,4 +157,68 @@ class DRM(object):
 
     def kill_tasks(self, tasks):
         for t in tasks:
-            self.kill(t)
\ No newline at end of file
+            self.kill(t)
+
+    def kill_command(self, job_keys):
+        """
+        :returns: (list) The arguments of a command that cancels the jobs `job_keys`.
+        """
+        raise NotImplementedError
+
+    def kill_job_key(self, task):
+        """
+        :returns: (str) How :meth:`kill_command` refers to `task`'s job.
+        """
+        return str(task.drm_job_key)
+
+    def _kill_in_batches(self, tasks):
+        """
+        Cancels the jobs of `tasks` with :meth:`kill_command`, `kill_batch_size` jobs at a time.  The commands are run
+        concurrently in the JobManager's submission pool, and waited on.  Failures are logged, ie. for jobs that had
+        already finished.
+
+        :returns: (int) The number of commands that failed.
+        """
+        job_keys = sorted({self.kill_job_key(t) for t in tasks if t.drm_jobID is not None})
+        commands = [self.kill_command(list(batch)) for batch in chunked(job_keys, self.kill_batch_size)]
+        results = self.jobmanager.submit_pool.map_async(_run_kill_command, commands).get(2 ** 31)
+        failed = 0
+        for command, (out, error) in zip(commands, results):
+            if error is not None:
+                failed += 1
+                tasks[0].log.warning('`%s ...` failed to kill %s job(s): %s %s' % (
+                    ' '.join(command[:2]), len(command) - 1, error, (out or '').strip()))
+        return failed
+
+
+def _run_submit_command(command):
+    """
+    Runs in a submission pool thread, so must not touch any Tasks.
+
+    :returns: (output, seconds it took, exception or None)
+    """
+    start = time.time()
+    try:
+        out = sp.check_output(command, env=os.environ, preexec_fn=preexec_function, shell=True)
+        return out, time.time() - start, None
+    except (sp.CalledProcessError, OSError) as e:
+        return None, time.time() - start, e
+
+
+def _run_kill_command(command):
+    """
+    Runs in a submission pool thread.
+
+    :returns: (output, exception or None)
+    """
+    try:
+        return sp.check_output(command, stderr=sp.STDOUT, preexec_fn=preexec_function), None
+    except sp.CalledProcessError as e:
+        return e.output, e
+    except OSError as e:
+        return None, e
+
+
+def preexec_function():
+    # Put submission commands in their own process group, so a ctrl+c is not forwarded to them
+    os.setpgrp()
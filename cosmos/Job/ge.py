@@ -2,32 +2,39 @@ import subprocess as sp
 import re
 import os
 
-from ..util.iterstuff import grouper
 from .drm import DRM
 
 
 class DRM_GE(DRM):
     name = 'ge'
+    supports_array_jobs = True
+    result_channel = 'spool'
+    job_name_option_re = r'\s*-N\s+("[^"]*"|\S+)'
 
-    def submit_job(self, task):
+    def submit_command(self, task):
         ns = ' ' + task.drm_native_specification if task.drm_native_specification else ''
-        qsub = 'qsub -o {stdout} -e {stderr} -b y -cwd -S /bin/bash -V{ns} '.format(stdout=task.output_stdout_path,
-                                                                                    stderr=task.output_stderr_path,
-                                                                                    ns=ns)
-
-        out = sp.check_output('{qsub} "{cmd_str}"'.format(cmd_str=self.jobmanager.get_command_str(task), qsub=qsub),
-                              env=os.environ,
-                              preexec_fn=preexec_function,
-                              shell=True)
-
-        task.drm_jobID = int(re.search('job (\d+) ', out).group(1))
+        stdout, stderr = self.jobmanager.job_output_paths(task)
+        qsub = 'qsub -o {stdout} -e {stderr} -b y -cwd -S /bin/bash -V{ns} '.format(stdout=stdout, stderr=stderr, ns=ns)
+        return '{qsub} "{cmd_str}"'.format(cmd_str=self.jobmanager.get_command_str(task), qsub=qsub)
+
+    def submit_array_command(self, tasks, dispatcher_path):
+        ns = self.array_native_specification(tasks[0])
+        ns = ' ' + ns if ns else ''
+        # the dispatcher redirects each element's output to its Task's stdout and stderr
+        return 'qsub -t 1-{n} -N "{name}" -o /dev/null -e /dev/null -b y -cwd -S /bin/bash -V{ns} "{dispatcher_path}"'.format(
+            n=len(tasks), name=re.sub('\W', '_', 'cosmos_%s' % tasks[0].stage.name), ns=ns,
+            dispatcher_path=dispatcher_path)
+
+    def parse_job_id(self, out):
+        # array jobs are acknowledged with "Your job-array 123.1-10:1 (...) has been submitted"
+        return int(re.search('job(?:-array)? (\d+)[ .]', out).group(1))
 
     def filter_is_done(self, tasks):
         if len(tasks):
             qjobs = qstat_all()
 
             def f(task):
-                jid = str(task.drm_jobID)
+                jid = str(task.drm_job_key)
                 if jid not in qjobs:
                     # print 'missing %s %s' % (task, task.drm_jobID)
                     return True
@@ -42,15 +49,15 @@ class DRM_GE(DRM):
     def drm_statuses(self, tasks):
         """
         :param tasks: tasks that have been submitted to the job manager
-        :returns: (dict) task.drm_jobID -> drm_status
+        :returns: (dict) task.drm_job_key -> drm_status
         """
         if len(tasks):
             qjobs = qstat_all()
 
             def f(task):
-                return qjobs.get(str(task.drm_jobID), dict()).get('state', '???')
+                return qjobs.get(str(task.drm_job_key), dict()).get('state', '???')
 
-            return {task.drm_jobID: f(task) for task in tasks}
+            return {task.drm_job_key: f(task) for task in tasks}
         else:
             return {}
 
@@ -60,26 +67,35 @@ class DRM_GE(DRM):
         raise NotImplementedError
 
     def kill_tasks(self, tasks):
-        for group in grouper(tasks, 50):
-            group = filter(lambda x: x is not None, group)
-            pids = ','.join(map(lambda t: str(t.drm_jobID), group))
-            sp.Popen(['qdel', pids], preexec_fn=preexec_function)
+        self._kill_in_batches(tasks)
+
+    def kill_command(self, job_keys):
+        return ['qdel', ','.join(job_keys)]
+
+    def kill_job_key(self, task):
+        # qdel addresses array elements as jobid.index
+        if task.drm_array_index is None:
+            return str(task.drm_jobID)
+        return '%s.%s' % (task.drm_jobID, task.drm_array_index)
 
 
 def qstat_all():
     """
-    returns a dict keyed by lsf job ids, who's values are a dict of bjob
-    information about the job
+    returns a dict keyed by ge job ids, who's values are a dict of qstat
+    information about the job.  Elements of array jobs are keyed by `jobid[index]`.
     """
     try:
-        lines = sp.check_output(['qstat'], preexec_fn=preexec_function).strip().split('\n')
+        lines = sp.check_output(['qstat', '-g', 'd'], preexec_fn=preexec_function).strip().split('\n')
     except (sp.CalledProcessError, OSError):
         return {}
     keys = re.split("\s+", lines[0])
     bjobs = {}
     for l in lines[2:]:
         items = re.split("\s+", l.strip())
-        bjobs[items[0]] = dict(zip(keys, items))
+        # pending jobs have no queue (ie. all.q@host), and only array elements have a trailing ja-task-ID
+        n = 9 if len(items) > 7 and '@' in items[7] else 8
+        key = '%s[%s]' % (items[0], items[n]) if len(items) > n else items[0]
+        bjobs[key] = dict(zip(keys, items))
     return bjobs
 
 
@@ -1,48 +1,108 @@
 from subprocess import Popen
+import errno
 import os
+import signal
+import time
 
-import psutil
 from .drm import DRM
+from .worker import usage_from_wait
 
 from .. import TaskStatus
 
 
 class DRM_Local(DRM):
     name = 'local'
+    pushes_events = True
+    result_channel = 'socket'
 
     def __init__(self, jobmanager):
         self.jobmanager = jobmanager
+        self._procs = dict()  # pid -> (Popen, task) of jobs that have not been reaped yet
+        self._usage = dict()  # task -> profile fields collected when its job was reaped
+        self._reaper_installed = False
+
+    def submit_jobs(self, tasks):
+        # starting a process is quick, so there's no point in using the submission pool
+        for task in tasks:
+            start = time.time()
+            self.submit_job(task)
+            self.jobmanager.submit_latency[self.name].add(time.time() - start)
+        return dict()
 
     def submit_job(self, task):
+        self._install_reaper()
+        stdout, stderr = self.jobmanager.job_output_paths(task)
         p = Popen(self.jobmanager.get_command_str(task),
-                  stdout=open(task.output_stderr_path, 'w'),
-                  stderr=open(task.output_stdout_path, 'w'),
-                  preexec_fn=preexec_function(),
+                  stdout=open(stdout, 'w'),
+                  stderr=open(stderr, 'w'),
+                  preexec_fn=preexec_function,
                   shell=True
                   )
         task.drm_jobID = p.pid
-
-    def _is_done(self, task):
+        # the Popen is kept so it doesn't reap the job itself when it is garbage collected
+        self._procs[p.pid] = (p, task)
+        if self.pushes_events:
+            # the job may have exited before it was registered, in which case its SIGCHLD was already handled.
+            # Otherwise filter_is_done does the reaping, and would never hear of jobs reaped here
+            self._reap()
+
+    def _install_reaper(self):
+        """
+        Reaps jobs when a SIGCHLD arrives, rather than polling every running job.  Signal handlers can only be set
+        from the main thread, elsewhere (ie. in the web interface) jobs are reaped when they are polled instead.
+        """
+        if self._reaper_installed:
+            return
+        self._reaper_installed = True
         try:
-            p = psutil.Process(task.drm_jobID)
-            p.wait(timeout=0)
-            return True
-        except psutil.TimeoutExpired:
-            pass
-        except psutil.NoSuchProcess:
-            # profile_output = json.load(open(task.output_profile_path, 'r'))
-            # exit_code = profile_output['exit_status']
-            return True
-
-        return False
+            signal.signal(signal.SIGCHLD, lambda signum, frame: self._reap())
+            # restart interrupted system calls.  select() never restarts, and the wakeup fd makes sure the scheduler
+            # wakes up even when the signal is received by another thread
+            signal.siginterrupt(signal.SIGCHLD, False)
+            signal.set_wakeup_fd(self.jobmanager._wakeup_w)
+        except ValueError:
+            self.pushes_events = False
+
+    def _reap(self):
+        """
+        Collects the jobs that have exited, along with their exit status and resource usage from os.wait4.  Only
+        our own jobs are waited for, so the exit status of other children (ie. bsub) isn't stolen.  Safe to call
+        from a signal handler, since no Task attributes are touched.
 
-    def filter_is_done(self, tasks):
-        return filter(self._is_done, tasks)
+        :returns: (list) the reaped Tasks
+        """
+        reaped = []
+        for pid in self._procs.keys():
+            try:
+                wpid, status, rusage = os.wait4(pid, os.WNOHANG)
+            except OSError as e:
+                if e.errno != errno.ECHILD:
+                    raise
+                # reaped by someone else, ie. a re-entrant call from the signal handler
+                wpid, status, rusage = pid, None, None
+            if wpid == 0:
+                continue
+            p, task = self._procs.pop(pid, (None, None))
+            if p is None:
+                continue
+            if status is not None:
+                self._usage[task] = usage_from_wait(status, rusage)
+                p.returncode = self._usage[task]['exit_status']
+            reaped.append(task)
+            if self.pushes_events:
+                self.jobmanager.push_finished(task)
+        return reaped
+
+    def job_usage(self, task):
+        return self._usage.pop(task, dict())
 
+    def filter_is_done(self, tasks):
+        done = set(self._reap())
+        return [t for t in tasks if t in done]
 
     def drm_statuses(self, tasks):
         """
-        :returns: (dict) task.drm_jobID -> drm_status
+        :returns: (dict) task.drm_job_key -> drm_status
         """
 
         def f(task):
@@ -53,15 +113,16 @@ class DRM_Local(DRM):
             else:
                 return ''
 
-        return {task.drm_jobID: f(task) for task in tasks}
+        return {task.drm_job_key: f(task) for task in tasks}
 
     def kill(self, task):
-        "Terminates a task"
-
+        "Terminates a task, and every process it started"
         try:
-            psutil.Process(task.drm_jobID).kill()
-        except psutil.NoSuchProcess:
-            pass
+            # jobs are started in their own process group
+            os.killpg(task.drm_jobID, signal.SIGKILL)
+        except OSError as e:
+            if e.errno != errno.ESRCH:
+                raise
 
 
     def kill_tasks(self, tasks):
@@ -70,9 +131,8 @@ class DRM_Local(DRM):
 
 
 def preexec_function():
-    # Ignore the SIGINT signal by setting the handler to the standard
-    # signal handler SIG_IGN.  This allows Cosmos to cleanly
-    # terminate jobs when there is a ctrl+c event
+    # Put the job in its own process group, so a ctrl+c is not sent to it.  This allows Cosmos to cleanly
+    # terminate jobs when there is a ctrl+c event, and to kill the job's whole process group
     os.setpgrp()
 
 
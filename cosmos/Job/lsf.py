@@ -2,6 +2,7 @@ import subprocess as sp
 import re
 import os
 
+from ..util.iterstuff import chunked
 from .drm import DRM
 
 
@@ -19,29 +20,40 @@ decode_lsf_state = dict([
 
 class DRM_LSF(DRM):
     name = 'lsf'
+    supports_array_jobs = True
+    result_channel = 'spool'
+    job_name_option_re = r'\s*-J\s+("[^"]*"|\S+)'
 
-    def submit_job(self, task):
+    def submit_command(self, task):
         ns = ' ' + task.drm_native_specification if task.drm_native_specification else ''
-        bsub = 'bsub -o {stdout} -e {stderr}{ns} '.format(stdout=task.output_stdout_path,
-                                                          stderr=task.output_stderr_path,
-                                                          ns=ns)
+        stdout, stderr = self.jobmanager.job_output_paths(task)
+        bsub = 'bsub -o {stdout} -e {stderr}{ns} '.format(stdout=stdout, stderr=stderr, ns=ns)
+        return '{bsub} "{cmd_str}"'.format(cmd_str=self.jobmanager.get_command_str(task), bsub=bsub)
 
-        out = sp.check_output('{bsub} "{cmd_str}"'.format(cmd_str=self.jobmanager.get_command_str(task), bsub=bsub),
-                              env=os.environ,
-                              preexec_fn=preexec_function(),
-                              shell=True)
+    def submit_array_command(self, tasks, dispatcher_path):
+        ns = self.array_native_specification(tasks[0])
+        ns = ' ' + ns if ns else ''
+        # the dispatcher redirects each element's output to its Task's stdout and stderr
+        return 'bsub -J "{name}[1-{n}]" -o /dev/null{ns} "{dispatcher_path}"'.format(
+            name=re.sub('\W', '_', 'cosmos_%s' % tasks[0].stage.name), n=len(tasks), ns=ns,
+            dispatcher_path=dispatcher_path)
 
-        task.drm_jobID = int(re.search('Job <(\d+)>', out).group(1))
+    def parse_job_id(self, out):
+        return int(re.search('Job <(\d+)>', out).group(1))
 
     def filter_is_done(self, tasks):
         if len(tasks):
-            bjobs = bjobs_all()
+            try:
+                bjobs = bjobs_statuses({t.drm_jobID for t in tasks})
+            except BjobsError as e:
+                # try again next poll, rather than take jobs we could not query for finished
+                tasks[0].log.warning('Could not poll lsf: %s' % e)
+                return []
 
             def f(task):
-                jid = str(task.drm_jobID)
+                jid = str(task.drm_job_key)
                 if jid not in bjobs:
-                    # prob in history
-                    # print 'missing %s %s' % (task, task.drm_jobID)
+                    # no longer in lsf's history
                     return True
                 else:
                     return bjobs[jid]['STAT'] in ['DONE', 'EXIT', 'UNKWN', 'ZOMBI']
@@ -53,44 +65,71 @@ class DRM_LSF(DRM):
     def drm_statuses(self, tasks):
         """
         :param tasks: tasks that have been submitted to the job manager
-        :returns: (dict) task.drm_jobID -> drm_status
+        :returns: (dict) task.drm_job_key -> drm_status
         """
         if len(tasks):
-            bjobs = bjobs_all()
+            try:
+                bjobs = bjobs_statuses({t.drm_jobID for t in tasks})
+            except BjobsError:
+                bjobs = dict()
 
             def f(task):
-                return bjobs.get(str(task.drm_jobID), dict()).get('STAT', '???')
+                return bjobs.get(str(task.drm_job_key), dict()).get('STAT', '???')
 
-            return {task.drm_jobID: f(task) for task in tasks}
+            return {task.drm_job_key: f(task) for task in tasks}
         else:
             return {}
 
-
     def kill(self, task):
         "Terminates a task"
         raise NotImplementedError
         # os.system('bkill {0}'.format(task.drm_jobID))
 
     def kill_tasks(self, tasks):
-        for t in tasks:
-            sp.check_call(['bkill', str(t.drm_jobID)])
+        self._kill_in_batches(tasks)
+
+    def kill_command(self, job_keys):
+        return ['bkill'] + job_keys
+
+
+class BjobsError(Exception): pass
 
 
-def bjobs_all():
+#: stderr line bjobs prints for each job id it has no record of
+_not_found_re = re.compile(r'^Job <[^>]+> is not found$')
+
+
+def bjobs_statuses(job_ids, batch_size=500):
     """
-    returns a dict keyed by lsf job ids, who's values are a dict of bjob
-    information about the job
+    Queries the status of specific jobs with `bjobs -o`, which is much cheaper than listing every job in the
+    history.  Elements of array jobs are keyed by `jobid[index]`.
+
+    :param job_ids: lsf job ids.
+    :param batch_size: the most job ids passed to one bjobs call.
+    :returns: (dict) job key -> dict(STAT=..., EXIT_CODE=...).  Jobs lsf no longer knows about are missing.
+    :raises BjobsError: if bjobs could not be run, or failed for any reason other than unknown job ids.
     """
-    try:
-        lines = sp.check_output(['bjobs', '-a']).split('\n')
-    except (sp.CalledProcessError, OSError):
-        return {}
-    bjobs = {}
-    header = re.split("\s\s+", lines[0])
-    for l in lines[1:]:
-        items = re.split("\s\s+", l)
-        bjobs[items[0]] = dict(zip(header, items))
-    return bjobs
+    r = dict()
+    for batch in chunked(sorted(set(map(str, job_ids))), batch_size):
+        try:
+            p = sp.Popen(['bjobs', '-a', '-noheader', '-o', "jobid jobindex stat exit_code delimiter=','"] + list(batch),
+                         stdout=sp.PIPE, stderr=sp.PIPE)
+            out, err = p.communicate()
+        except OSError as e:
+            raise BjobsError('could not run bjobs: %s' % e)
+        # jobs that are not found are reported on stderr, and make bjobs exit non-zero
+        errors = [l for l in err.strip().splitlines() if not _not_found_re.match(l.strip())]
+        if p.returncode != 0 and (errors or not err.strip()):
+            raise BjobsError('bjobs exited with %s: %s' % (p.returncode, err.strip()))
+        batch_ids = set(batch)
+        for line in out.splitlines():
+            items = line.strip().split(',')
+            if len(items) != 4 or items[0] not in batch_ids:
+                continue
+            jobid, jobindex, stat, exit_code = items
+            key = jobid if jobindex in ('0', '-') else '%s[%s]' % (jobid, jobindex)
+            r[key] = dict(STAT=stat, EXIT_CODE=exit_code)
+    return r
 
 
 def preexec_function():
@@ -0,0 +1,145 @@
+import itertools as it
+import json
+import multiprocessing
+import os
+import signal
+import subprocess as sp
+import sys
+import threading
+import time
+from collections import deque
+
+from .drm import DRM
+from . import worker
+from .. import TaskStatus
+
+
+class DRM_Pool(DRM):
+    """
+    Runs Tasks in a pool of long-lived local worker processes, which skips starting psprofile and forking from the
+    runner for every Task.  Worth it for workflows with many short Tasks.
+    """
+    name = 'pool'
+    pushes_events = True
+    profiles_jobs = False
+
+    #: The number of worker processes, or None for one per cpu
+    num_workers = None
+
+    def __init__(self, jobmanager):
+        self.jobmanager = jobmanager
+        self._workers = []
+        self._idle = []  # workers waiting for a job
+        self._pending = deque()  # jobs waiting for a worker
+        self._assigned = dict()  # worker -> the id of the job it is running
+        self._tasks = dict()  # job id -> task
+        self._pids = dict()  # job id -> pid of the running job
+        self._usage = dict()  # task -> profile fields reported by its worker
+        self._lock = threading.Lock()
+        self._job_ids = it.count(1)
+
+    def _start_workers(self):
+        script = os.path.splitext(worker.__file__)[0] + '.py'
+        for _ in range(self.num_workers or multiprocessing.cpu_count()):
+            # in its own process group, so a ctrl+c is handled by the runner alone
+            w = sp.Popen([sys.executable, script], stdin=sp.PIPE, stdout=sp.PIPE, preexec_fn=os.setpgrp,
+                         close_fds=True)
+            reader = threading.Thread(target=self._read_results, args=(w,))
+            reader.daemon = True
+            reader.start()
+            self._workers.append(w)
+            self._idle.append(w)
+
+    def submit_jobs(self, tasks):
+        # handing a job to a worker is quick, so there's no point in using the submission pool
+        for task in tasks:
+            start = time.time()
+            self.submit_job(task)
+            self.jobmanager.submit_latency[self.name].add(time.time() - start)
+        return dict()
+
+    def submit_job(self, task):
+        if not self._workers:
+            self._start_workers()
+        job = dict(id=next(self._job_ids),
+                   command_script=task.output_command_script_path,
+                   stdout=task.output_stdout_path,
+                   stderr=task.output_stderr_path)
+        task.drm_jobID = job['id']
+        self._tasks[job['id']] = task
+        with self._lock:
+            if self._idle:
+                self._send(self._idle.pop(), job)
+            else:
+                self._pending.append(job)
+
+    def _send(self, w, job):
+        "Must be called with the lock held"
+        self._assigned[w] = job['id']
+        w.stdin.write(json.dumps(job) + '\n')
+        w.stdin.flush()
+
+    def _read_results(self, w):
+        """
+        Runs in a reader thread per worker.  Records the results of its jobs, hands it the next pending job, and
+        tells the JobManager.
+        """
+        for line in iter(w.stdout.readline, ''):
+            msg = json.loads(line)
+            if 'pid' in msg:
+                self._pids[msg['id']] = msg['pid']
+                continue
+            self._job_finished(msg['id'], msg['usage'])
+            with self._lock:
+                del self._assigned[w]
+                if self._pending:
+                    self._send(w, self._pending.popleft())
+                else:
+                    self._idle.append(w)
+
+        # the worker died, so the job it was running will never report back
+        with self._lock:
+            job_id = self._assigned.pop(w, None)
+        if job_id is not None:
+            self._job_finished(job_id, dict())
+
+    def _job_finished(self, job_id, usage):
+        self._pids.pop(job_id, None)
+        task = self._tasks.pop(job_id, None)
+        if task is not None:
+            self._usage[task] = usage
+            self.jobmanager.push_finished(task)
+
+    def job_usage(self, task):
+        return self._usage.pop(task, dict())
+
+    def filter_is_done(self, tasks):
+        return [t for t in tasks if t in self._usage]
+
+    def drm_statuses(self, tasks):
+        """
+        :returns: (dict) task.drm_job_key -> drm_status
+        """
+        pending = {job['id'] for job in self._pending}
+
+        def f(task):
+            if task.drm_jobID is None:
+                return '!'
+            if task.status == TaskStatus.submitted:
+                return 'Queued' if task.drm_jobID in pending else 'Running'
+            else:
+                return ''
+
+        return {task.drm_job_key: f(task) for task in tasks}
+
+    def kill_tasks(self, tasks):
+        job_ids = {t.drm_jobID for t in tasks}
+        with self._lock:
+            self._pending = deque(job for job in self._pending if job['id'] not in job_ids)
+        for job_id in job_ids:
+            pid = self._pids.get(job_id)
+            if pid is not None:
+                try:
+                    os.killpg(pid, signal.SIGKILL)
+                except OSError:
+                    pass
@@ -0,0 +1,154 @@
+import atexit
+import ctypes
+import ctypes.util
+import errno
+import json
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import time
+
+from . import deliver
+
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_TO = 0x80
+
+
+class ResultChannel(object):
+    """
+    Receives the profiles that jobs push when they finish (see deliver.py), so finished Tasks don't have to wait for
+    their profile.json to show up on the filesystem.  Jobs on this machine send a datagram to a Unix socket.  Jobs on
+    other hosts rename a file into a spool directory on the shared filesystem, which is watched with inotify where
+    possible, and otherwise listed every `scan_interval` seconds.
+    """
+
+    #: Seconds between listings of the spool directory, when inotify doesn't (ie. on NFS) or can't watch it
+    scan_interval = 1
+
+    def __init__(self, spool_dir=None):
+        """
+        :param spool_dir: A directory on the filesystem shared with the jobs.  If None, only jobs on this machine can
+            deliver results.
+        """
+        self.spool_dir = spool_dir
+        self.results = dict()  # task id -> profile
+        self._socket = None
+        self._socket_dir = None
+        self._inotify_fd = None
+        self._spool_ready = False
+        self._last_scan = 0
+
+    @property
+    def socket_path(self):
+        if self._socket is None:
+            self._socket_dir = tempfile.mkdtemp(prefix='cosmos_results')
+            self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            self._socket.bind(os.path.join(self._socket_dir, 'results.sock'))
+            self._socket.setblocking(False)
+            atexit.register(self.close)
+        return os.path.join(self._socket_dir, 'results.sock')
+
+    def _prepare_spool(self):
+        if not self._spool_ready:
+            # results left behind by an earlier run could belong to Tasks whose ids have been reused
+            shutil.rmtree(self.spool_dir, ignore_errors=True)
+            os.makedirs(self.spool_dir)
+            self._inotify_fd = _inotify_watch(self.spool_dir, IN_MOVED_TO | IN_CLOSE_WRITE)
+            self._spool_ready = True
+
+    def deliver_command(self, task, kind):
+        """
+        :param kind: 'socket' or 'spool'
+        :returns: (str) A shell command that delivers `task`'s profile once its job has been profiled, or None if
+            `kind` isn't available.
+        """
+        if kind == 'socket':
+            address = self.socket_path
+        elif kind == 'spool' and self.spool_dir is not None:
+            self._prepare_spool()
+            address = self.spool_dir
+        else:
+            return None
+        return '{python} {script} --{kind} {address} {task.id} {task.output_profile_path}'.format(
+            python=sys.executable, script=os.path.splitext(deliver.__file__)[0] + '.py', kind=kind,
+            address=address, task=task)
+
+    def fds(self):
+        """
+        :returns: (list) File descriptors that become readable when results arrive, for select()
+        """
+        fds = []
+        if self._socket is not None:
+            fds.append(self._socket.fileno())
+        if self._inotify_fd is not None:
+            fds.append(self._inotify_fd)
+        return fds
+
+    def collect(self, scan=False):
+        """
+        Receives the results that have arrived.
+
+        :param scan: list the spool directory if `scan_interval` seconds have passed since it was last listed, ie.
+            because results that inotify can't see are expected.
+        """
+        if self._socket is not None:
+            while True:
+                try:
+                    self._add(self._socket.recv(1 << 20))
+                except socket.error as e:
+                    if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                        break
+                    raise
+
+        if self._spool_ready:
+            notified = False
+            if self._inotify_fd is not None:
+                try:
+                    while os.read(self._inotify_fd, 65536):
+                        notified = True
+                except OSError as e:
+                    if e.errno != errno.EAGAIN:
+                        raise
+            if notified or (scan and time.time() - self._last_scan >= self.scan_interval):
+                self._scan_spool()
+
+    def _scan_spool(self):
+        self._last_scan = time.time()
+        for name in os.listdir(self.spool_dir):
+            if name.endswith('.json'):
+                path = os.path.join(self.spool_dir, name)
+                with open(path) as fh:
+                    self._add(fh.read())
+                os.unlink(path)
+
+    def _add(self, payload):
+        result = json.loads(payload)
+        self.results[result['task_id']] = result['profile']
+
+    def close(self):
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+            shutil.rmtree(self._socket_dir, ignore_errors=True)
+        if self._inotify_fd is not None:
+            os.close(self._inotify_fd)
+            self._inotify_fd = None
+
+
+def _inotify_watch(path, mask):
+    """
+    :returns: (int) A non-blocking inotify file descriptor watching `path`, or None if inotify isn't available.
+    """
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK)
+    except (OSError, AttributeError):
+        return None
+    if fd < 0:
+        return None
+    if libc.inotify_add_watch(fd, path, mask) < 0:
+        os.close(fd)
+        return None
+    return fd
@@ -0,0 +1,83 @@
+import heapq
+import itertools as it
+import json
+import random
+import time
+
+from .drm import DRM
+
+
+class DRM_Sim(DRM):
+    """
+    Simulates a cluster without running anything, to benchmark the scheduler.  A job waits `queue_latency` seconds,
+    then for a free slot, then "runs" for a runtime drawn for its stage, and finally writes a synthetic profile.
+
+    Configure it by setting the class attributes, ie. ``DRM_Sim.slots = 100``.
+    """
+    name = 'sim'
+    poll_interval = .1
+
+    #: The number of jobs that can run at once
+    slots = 1000
+    #: Seconds between a job's submission and when it can start
+    queue_latency = 0
+    #: stage name -> function that returns a runtime in seconds.  Other stages use :attr:`default_runtime`.
+    runtimes = dict()
+    default_runtime = staticmethod(lambda: 0)
+    #: stage name -> the fraction of jobs that fail.  Other stages use :attr:`default_failure_rate`.
+    failure_rates = dict()
+    default_failure_rate = 0.0
+
+    def __init__(self, jobmanager):
+        self.jobmanager = jobmanager
+        self._slots_free_at = []  # heap of when each busy slot frees up
+        self._jobs = dict()  # task -> (start time, finish time, exit status)
+        self._job_ids = it.count(1)
+
+    def submit_jobs(self, tasks):
+        # nothing to wait for, so there's no point in using the submission pool
+        for task in tasks:
+            start = time.time()
+            self.submit_job(task)
+            self.jobmanager.submit_latency[self.name].add(time.time() - start)
+        return dict()
+
+    def submit_job(self, task):
+        start = time.time() + self.queue_latency
+        if len(self._slots_free_at) >= self.slots:
+            start = max(start, heapq.heappop(self._slots_free_at))
+        finish = start + self.runtimes.get(task.stage.name, self.default_runtime)()
+        heapq.heappush(self._slots_free_at, finish)
+
+        failure_rate = self.failure_rates.get(task.stage.name, self.default_failure_rate)
+        self._jobs[task] = (start, finish, 1 if random.random() < failure_rate else 0)
+        task.drm_jobID = next(self._job_ids)
+
+    def filter_is_done(self, tasks):
+        now = time.time()
+        done = [t for t in tasks if self._jobs[t][1] <= now]
+        for task in done:
+            start, finish, exit_status = self._jobs.pop(task)
+            runtime = int(round(finish - start))
+            with open(task.output_profile_path, 'w') as fh:
+                json.dump(dict(exit_status=exit_status, wall_time=runtime, cpu_time=runtime, user_time=runtime,
+                               system_time=0, percent_cpu=100, max_rss_mem_kb=0, avg_rss_mem_kb=0), fh)
+        return done
+
+    def drm_statuses(self, tasks):
+        """
+        :returns: (dict) task.drm_job_key -> drm_status
+        """
+        now = time.time()
+
+        def f(task):
+            if task not in self._jobs:
+                return ''
+            start, finish, _ = self._jobs[task]
+            return 'PEND' if now < start else 'RUN'
+
+        return {task.drm_job_key: f(task) for task in tasks}
+
+    def kill_tasks(self, tasks):
+        for task in tasks:
+            self._jobs.pop(task, None)
@@ -0,0 +1,69 @@
+"""
+A long-lived worker process of the pool DRM.  Reads jobs from stdin and writes their results to stdout, one JSON
+object per line.  Only depends on the standard library, so it starts quickly when run as a script.
+"""
+import errno
+import json
+import os
+import subprocess
+import sys
+import time
+
+
+def usage_from_wait(status, rusage):
+    """
+    :param status: A status from os.wait4.
+    :param rusage: The resource usage from os.wait4.
+    :returns: (dict) Task profile fields.
+    """
+    return dict(exit_status=-os.WTERMSIG(status) if os.WIFSIGNALED(status) else os.WEXITSTATUS(status),
+                user_time=int(round(rusage.ru_utime)),
+                system_time=int(round(rusage.ru_stime)),
+                cpu_time=int(round(rusage.ru_utime + rusage.ru_stime)),
+                max_rss_mem_kb=rusage.ru_maxrss,
+                io_read_kb=rusage.ru_inblock / 2,  # 512 byte blocks
+                io_write_kb=rusage.ru_oublock / 2,
+                ctx_switch_voluntary=rusage.ru_nvcsw,
+                ctx_switch_involuntary=rusage.ru_nivcsw)
+
+
+def run_job(job, emit):
+    """
+    Runs a job's command script, and emits its pid once it started and its usage once it finished.
+    """
+    start = time.time()
+    with open(job['stdout'], 'w') as stdout, open(job['stderr'], 'w') as stderr:
+        try:
+            p = subprocess.Popen(['/bin/bash', job['command_script']], stdout=stdout, stderr=stderr,
+                                 preexec_fn=os.setpgrp, close_fds=True)
+        except OSError as e:
+            stderr.write('Failed to start %s: %s\n' % (job['command_script'], e))
+            emit(dict(id=job['id'], usage=dict(exit_status=127, wall_time=0)))
+            return
+    emit(dict(id=job['id'], pid=p.pid))
+
+    while True:
+        try:
+            _, status, rusage = os.wait4(p.pid, 0)
+            break
+        except OSError as e:
+            if e.errno != errno.EINTR:
+                raise
+    usage = usage_from_wait(status, rusage)
+    usage['wall_time'] = int(round(time.time() - start))
+    p.returncode = usage['exit_status']
+    emit(dict(id=job['id'], usage=usage))
+
+
+def main():
+    def emit(msg):
+        sys.stdout.write(json.dumps(msg) + '\n')
+        sys.stdout.flush()
+
+    # exits when the runner closes its end of the pipe
+    for line in iter(sys.stdin.readline, ''):
+        run_job(json.loads(line), emit)
+
+
+if __name__ == '__main__':
+    main()
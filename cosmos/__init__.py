@@ -38,7 +38,8 @@ def default_get_submit_args(task, default_queue=None, grid_engine_parallel_envir
     """
     drm = task.drm or default_queue
     default_job_priority = None
-    use_mem_req = False
+    # mem_req is only passed on for Tasks whose Tool opted in to having it predicted from past usage
+    use_mem_req = 'mem_req' in task.predicted_reqs
 
     cpu_req = task.cpu_req
     mem_req = task.mem_req
@@ -49,14 +50,14 @@ def default_get_submit_args(task, default_queue=None, grid_engine_parallel_envir
     priority = ' -p %s' % default_job_priority if default_job_priority else ''
 
     if drm == 'lsf':
-        rusage = '-R "rusage[mem={mem}] ' if mem_req and use_mem_req else ''
+        rusage = 'rusage[mem={0}] '.format(mem_req) if mem_req and use_mem_req else ''
         time = ' -W 0:{0}'.format(task.time_req) if task.time_req else ''
         return '-R "{rusage}span[hosts=1]" -n {task.cpu_req}{time}{queue} -J "{jobname}"'.format(**locals())
 
     elif drm == 'ge':
         mem_req_s = ' -l h_vmem=%sM' % int(math.ceil(mem_req / float(cpu_req))) if mem_req and use_mem_req else ''
         return '-pe {grid_engine_parallel_environment} {cpu_req}{queue}{mem_req_s}{priority} -N "{jobname}"'.format(**locals())
-    elif drm == 'local':
+    elif drm in ['local', 'pool', 'sim']:
         return None
     else:
         raise Exception('DRM not supported: %s' % drm)
@@ -78,9 +79,9 @@ class Cosmos(object):
         :param func get_submit_args: a function that returns arguments to be passed to the job submitter, like resource
             requirements or the queue to submit to.  See :func:`cosmos.default_get_submit_args` for details
         :param Flask flask_app: A Flask application instance for the web interface.  The default behavior is to create one.
-        :param str default_drm: The Default DRM to use (ex 'local', 'lsf', or 'ge')
+        :param str default_drm: The Default DRM to use (ex 'local', 'pool', 'lsf', or 'ge', or 'sim' to simulate a cluster)
         """
-        assert default_drm in ['local', 'lsf', 'ge'], 'unsupported drm: %s' % default_drm
+        assert default_drm in ['local', 'pool', 'lsf', 'ge', 'sim'], 'unsupported drm: %s' % default_drm
         assert '://' in database_url, 'Invalid database_url: %s' % database_url
 
         if flask_app:
@@ -105,7 +106,7 @@ class Cosmos(object):
         # add_cosmos_admin(flask_app, self.session)
 
     def start(self, name, output_dir=os.getcwd(), restart=False, skip_confirm=False, max_cpus=None, max_attempts=1,
-              check_output_dir=True):
+              check_output_dir=True, max_mem=None, bulk_resume=False):
         """
         Start, resume, or restart an execution based on its name.  If resuming, deletes failed tasks.
 
@@ -114,8 +115,11 @@ class Cosmos(object):
         :param bool restart: If True and the execution exists, delete it first.
         :param bool skip_confirm: (If True, do not prompt the shell for input before deleting executions or files.
         :param int max_cpus: The maximum number of CPUs to use at once.
+        :param int max_mem: The maximum amount of memory, in MB, to use at once (based on the sum of mem_req).
         :param int max_attempts: The maximum number of times to retry a failed job.
         :param bool check_output_dir: Raise an error if this is a new workflow, and output_dir already exists.
+        :param bool bulk_resume: If resuming, delete failed tasks with a few set based SQL DELETEs rather than loading
+            every task and deleting them one at a time.  Much faster for large executions.
 
         :returns: An Execution instance.
         """
@@ -166,16 +170,22 @@ class Cosmos(object):
 
             ex.log.info('Resuming %s' % ex)
             session.add(ex)
-            failed_tasks = [t for s in ex.stages for t in s.tasks if not t.successful]
-            n = len(failed_tasks)
-            if n:
-                ex.log.info('Deleting %s failed task(s) from SQL database, delete_files=%s' % (n, False))
-                for t in failed_tasks:
-                    session.delete(t)
-
-            for stage in it.ifilter(lambda s: len(s.tasks) == 0, ex.stages):
-                ex.log.info('Deleting stage %s, since it has no successful Tasks' % stage)
-                session.delete(stage)
+            if bulk_resume:
+                n_tasks, n_stages = ex.bulk_delete_unsuccessful_tasks()
+                ex.log.info('Deleted %s failed task(s) and %s stage(s) without successful tasks from SQL database, '
+                            'delete_files=%s' % (n_tasks, n_stages, False))
+            else:
+                failed_tasks = [t for s in ex.stages for t in s.tasks if not t.successful]
+                n = len(failed_tasks)
+                if n:
+                    ex.log.info('Deleting %s failed task(s) from SQL database, delete_files=%s' % (n, False))
+                    for t in failed_tasks:
+                        session.delete(t)
+
+                for stage in it.ifilter(lambda s: len(s.tasks) == 0, ex.stages):
+                    ex.log.info('Deleting stage %s, since it has no successful Tasks' % stage)
+                    session.delete(stage)
+            ex.invalidate_graphs()
 
         else:
             # start from scratch
@@ -187,6 +197,7 @@ class Cosmos(object):
             session.add(ex)
 
         ex.max_cpus = max_cpus
+        ex.max_mem = max_mem
         ex.max_attempts = max_attempts
         ex.info['last_cmd_executed'] = get_last_cmd_executed()
         ex.info['cwd'] = os.getcwd()
@@ -201,11 +212,15 @@ class Cosmos(object):
 
     def initdb(self):
         """
-        Initialize the database via sql CREATE statements.  If the tables already exists, nothing will happen.
+        Initialize the database via sql CREATE statements.  If the tables already exist, only the columns added
+        since they were created are, via sql ALTER TABLE statements.
         """
         print >> sys.stderr, 'Initializing sql database for Cosmos v%s...' % __version__
         Base.metadata.create_all(bind=self.session.bind)
-        from .db import MetaData
+        from .db import MetaData, add_missing_columns
+
+        for table, column in add_missing_columns(self.session.bind):
+            print >> sys.stderr, 'Added column %s.%s' % (table, column)
 
         meta = MetaData(initdb_library_version=__version__)
         self.session.add(meta)
@@ -251,6 +266,7 @@ class ExecutionFailed(Exception): pass
 import blinker
 
 signal_task_status_change = blinker.Signal()
+signal_tasks_status_change = blinker.Signal()  # sent once for a batch of Tasks, see Task.set_task_statuses
 signal_stage_status_change = blinker.Signal()
 signal_execution_status_change = blinker.Signal()
 
@@ -314,4 +330,5 @@ from .models.Tool import Tool, Tool_old, Input, Inputs
 from .models.Execution import Execution
 from .util.args import add_execution_args
 from .util.tool import one2one, one2many, many2one, many2many, make_dict
+from .util.advisor import ResourceAdvisor
 from .graph.draw import draw_task_graph, draw_stage_graph
\ No newline at end of file
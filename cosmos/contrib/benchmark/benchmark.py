@@ -0,0 +1,112 @@
+"""
+Benchmarks the scheduler on synthetic fan-out/fan-in workflows, run on the simulated `sim` DRM so no jobs are
+actually launched.  For each workflow size, reports the seconds spent building the task graph, committing it to the
+database, submitting, processing finished tasks, committing status changes, and waiting on the DRM.
+
+ex::
+
+    python -m cosmos.contrib.benchmark.benchmark 1000 10000 100000 --slots 5000 --runtime 1
+"""
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from cosmos import Cosmos, Tool, one2one, many2one, abstract_output_taskfile as aof, abstract_input_taskfile as aif
+from cosmos.job.sim import DRM_Sim
+
+
+class Split(Tool):
+    def cmd(self, chunk, group, out_txt=aof('split.txt')):
+        return 'echo {chunk} > {out_txt}'.format(**locals())
+
+
+class Work(Tool):
+    def cmd(self, in_txt=aif(format='txt'), out_txt=aof('work.txt')):
+        return 'cat {in_txt} > {out_txt}'.format(**locals())
+
+
+class Merge(Tool):
+    def cmd(self, in_txts=aif(format='txt', n='>=1'), out_txt=aof('merge.txt')):
+        return 'cat {0} > {1}'.format(' '.join(map(str, in_txts)), out_txt)
+
+
+def build_workflow(execution, num_tasks, fan_in=100, chunk_size=None):
+    """
+    Adds `num_tasks` Split tasks, a Work task for each Split (one2one), a Merge for every `fan_in` Works
+    (many2one), and a final Merge of all the Merges.
+    """
+    splits = execution.add((Split(tags=dict(chunk=c, group=c // fan_in), out='{group}/{chunk}')
+                            for c in xrange(num_tasks)), chunk_size=chunk_size)
+    works = execution.add(one2one(Work, splits), chunk_size=chunk_size)
+    merges = execution.add(many2one(Merge, works, groupby=['group'], out='{group}'), name='Merge')
+    execution.add(many2one(Merge, merges, groupby=[], out=''), name='MergeAll')
+
+
+def benchmark(num_tasks, output_dir, fan_in=100, chunk_size=None, max_attempts=1, run_kwargs=None):
+    """
+    :returns: (dict) phase -> seconds, and the number of tasks and scheduler passes.
+    """
+    os.makedirs(output_dir)
+    cosmos = Cosmos('sqlite:///%s' % os.path.join(output_dir, 'cosmos.sqlite'), default_drm='sim')
+    cosmos.initdb()
+    execution = cosmos.start('benchmark_%s' % num_tasks, os.path.join(output_dir, 'out'), skip_confirm=True,
+                             max_attempts=max_attempts)
+
+    start = time.time()
+    build_workflow(execution, num_tasks, fan_in, chunk_size)
+    stats = dict(graph=time.time() - start)
+
+    start = time.time()
+    stats['successful'] = execution.run(**(run_kwargs or dict()))
+    stats['run'] = time.time() - start
+    stats.update(execution.run_stats)
+    stats['tasks'] = len(execution.tasks)
+    return stats
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument('sizes', type=int, nargs='*', default=[1000, 10000],
+                   help='number of tasks fanned out to, per benchmark')
+    p.add_argument('--fan_in', type=int, default=100, help='number of tasks merged by each Merge task')
+    p.add_argument('--slots', type=int, default=DRM_Sim.slots, help='jobs the simulated cluster runs at once')
+    p.add_argument('--queue_latency', type=float, default=0, help='seconds a job is queued before it can start')
+    p.add_argument('--runtime', type=float, default=0, help='mean of the exponentially distributed job runtimes')
+    p.add_argument('--failure_rate', type=float, default=0, help='fraction of Work jobs that fail')
+    p.add_argument('--max_attempts', type=int, default=1)
+    p.add_argument('--chunk_size', type=int, default=None, help='add tasks in chunks of this size (see Execution.add)')
+    p.add_argument('--bulk_insert', action='store_true')
+    p.add_argument('--commit_interval', type=float, default=None)
+    p.add_argument('--output_dir', help='defaults to a temporary directory, which is deleted afterwards')
+    args = p.parse_args()
+
+    DRM_Sim.slots = args.slots
+    DRM_Sim.queue_latency = args.queue_latency
+    if args.runtime:
+        DRM_Sim.default_runtime = staticmethod(lambda: random.expovariate(1.0 / args.runtime))
+    DRM_Sim.failure_rates = dict(Work=args.failure_rate)
+    run_kwargs = dict(bulk_insert=args.bulk_insert, commit_interval=args.commit_interval)
+
+    columns = ['tasks', 'graph', 'initial_commit', 'prepare', 'submit', 'process_finished', 'commit', 'wait', 'run',
+               'passes', 'successful']
+    rows = []
+    for size in args.sizes:
+        output_dir = args.output_dir or tempfile.mkdtemp(prefix='cosmos_benchmark')
+        try:
+            rows.append(benchmark(size, os.path.join(output_dir, str(size)), args.fan_in, args.chunk_size,
+                                  args.max_attempts, run_kwargs))
+        finally:
+            if not args.output_dir:
+                shutil.rmtree(output_dir)
+
+    print '\t'.join(columns)
+    for row in rows:
+        print '\t'.join('%.2f' % row.get(c, 0) if isinstance(row.get(c, 0), float) else str(row.get(c, 0))
+                        for c in columns)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Benchmarks the overhead of one poll of the job profiler (cosmos/contrib/profile/profile.py) on a process tree of
+sleeping workers, comparing the old walker, which ran `ps --ppid` for every process and re-parsed the field list from
+the man page for every /proc/pid/stat it read, with the single pass over /proc.  Reports the wall and cpu
+milliseconds per poll, cpu time including that of forked `ps` processes.
+
+ex::
+
+    python -m cosmos.contrib.benchmark.profiler 10 40 160 --polls 20
+"""
+import argparse
+import os
+import subprocess as sp
+import time
+
+from cosmos.contrib.profile import read_man_proc
+from cosmos.contrib.profile.profile import Profile, walk_proc
+
+
+def ps_children(pid):
+    p = sp.Popen(['/bin/ps', 'h', '--ppid', str(pid), '-o', 'pid'], stdout=sp.PIPE)
+    return [int(child) for child in p.communicate()[0].split()]
+
+
+def ps_descendants(pid):
+    return [pid] + [d for child in ps_children(pid) for d in ps_descendants(child)]
+
+
+def old_poll(profile, root_pid):
+    for pid in ps_descendants(root_pid):
+        try:
+            stat_fields = read_man_proc.get_stat_and_status_fields()
+            with open('/proc/{0}/stat'.format(pid), 'r') as f:
+                zip(stat_fields, f.readline().split(' '))
+            profile.read_proc_status(pid)
+        except IOError:
+            pass
+
+
+def new_poll(profile, root_pid):
+    for pid in walk_proc(root_pid, profile.stat_offsets):
+        try:
+            profile.read_proc_status(pid)
+        except IOError:
+            pass
+
+
+def measure(poll, polls, *args):
+    """
+    :returns: (wall, cpu) milliseconds per poll
+    """
+    start_wall, start_cpu = time.time(), sum(os.times()[:4])
+    for _ in xrange(polls):
+        poll(*args)
+    return (1000 * (time.time() - start_wall) / polls,
+            1000 * (sum(os.times()[:4]) - start_cpu) / polls)
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument('workers', type=int, nargs='*', default=[10, 40], help='number of worker processes, per benchmark')
+    p.add_argument('--polls', type=int, default=20)
+    args = p.parse_args()
+
+    profile = Profile(['true'])
+    print '\t'.join(['workers', 'old_wall_ms', 'old_cpu_ms', 'new_wall_ms', 'new_cpu_ms'])
+    for n in args.workers:
+        # workers are children of a shell, like the processes of a job
+        tree = sp.Popen(['/bin/bash', '-c', 'for i in $(seq %s); do sleep 600 & done; wait' % n])
+        try:
+            while len(profile.and_descendants(tree.pid)) < n + 1:
+                time.sleep(.1)
+            old = measure(old_poll, args.polls, profile, os.getpid())
+            new = measure(new_poll, args.polls, profile, os.getpid())
+        finally:
+            sp.call(['pkill', '-P', str(tree.pid)])
+            tree.wait()
+        print '\t'.join([str(n)] + ['%.2f' % ms for ms in old + new])
+
+
+if __name__ == '__main__':
+    main()
@@ -31,6 +31,49 @@ import argparse
     MAX(FDSize), AVG(FDSize), MAX(VmPeak), AVG(VmSize), MAX(VmLck), AVG(VmLck), AVG(VmRSS), AVG(VmData), MAX(VmData), AVG(VmLib), MAX(VmPTE), AVG(VmPTE) 
 """
 
+#: field name -> column in /proc/pid/stat, parsed from the man page once
+STAT_COLUMNS = dict(read_man_proc.get_stat_and_status_fields())
+
+
+def read_stat(pid, offsets):
+    """
+    :param offsets: [(field_name, offset), ...] of the fields to return, where the offset is counted from the state
+        field, the first one after the command name.
+    :returns: (ppid, [(field_name, int value), ...]) from /proc/pid/stat
+    """
+    with open('/proc/{0}/stat'.format(pid), 'r') as f:
+        line = f.readline()
+    # the command name is in parentheses and may contain spaces
+    fields = line[line.rindex(')') + 2:].split(' ')
+    return int(fields[STAT_COLUMNS['ppid'] - 2]), [(name, int(fields[offset])) for name, offset in offsets]
+
+
+def walk_proc(root_pid, offsets):
+    """
+    Reads every /proc/*/stat once, and follows the ppids in memory to find the descendants of `root_pid`.
+
+    :param offsets: see :func:`read_stat`
+    :returns: {pid: [(field_name, int value), ...]} of `root_pid` and all of its descendants
+    """
+    stats = {}
+    children = {}
+    for name in os.listdir('/proc'):
+        if name.isdigit():
+            try:
+                ppid, stats[int(name)] = read_stat(name, offsets)
+            except (IOError, ValueError):
+                continue  # process finished before file could be read
+            children.setdefault(ppid, []).append(int(name))
+
+    tree = {}
+    stack = [root_pid]
+    while stack:
+        pid = stack.pop()
+        if pid in stats:
+            tree[pid] = stats[pid]
+            stack.extend(children.get(pid, []))
+    return tree
+
 
 class Profile:
     fields_to_get = {'UPDATE': ['VmPeak','VmHWM'] + #/proc/status
@@ -39,6 +82,17 @@ class Profile:
                                ['num_threads'] #/proc/stat
                      }
     
+    #INSERT field -> the name of its summary statistics, ie. max_rss_mem and avg_rss_mem
+    insert_stats = {'FDSize': 'fdsize', 'VmSize': 'virtual_mem', 'VmLck': 'locked_mem', 'VmRSS': 'rss_mem',
+                    'VmData': 'data_mem', 'VmLib': 'lib_mem', 'VmPTE': 'pte_mem', 'num_threads': 'num_threads'}
+    #summary statistic -> the UPDATE field summed over all processes
+    update_sums = {'block_io_delays': 'delayacct_blkio_ticks', 'user_time': 'utime', 'system_time': 'stime',
+                   'major_page_faults': 'majflt', 'minor_page_faults': 'minflt',
+                   'voluntary_context_switches': 'voluntary_ctxt_switches',
+                   'nonvoluntary_context_switches': 'nonvoluntary_ctxt_switches'}
+    #summary statistic -> the UPDATE field maxed over all processes
+    update_maxes = {'single_proc_max_peak_virtual_mem': 'VmPeak', 'single_proc_max_peak_rss': 'VmHWM'}
+
     proc = None #the main subprocess object
     poll_number = 0 #number of polls so far
     
@@ -46,8 +100,19 @@ class Profile:
     def all_pids(self):
         """This main process and all of its descendant's pids"""
         return self.and_descendants(os.getpid())
+
+    @property
+    def all_procs(self):
+        """This main process and all of its descendants, with their /proc/pid/stat fields"""
+        return walk_proc(os.getpid(), self.stat_offsets)
     
-    def __init__(self,command,poll_interval=1,output_file=None,database_file=':memory:'):
+    def __init__(self,command,poll_interval=1,output_file=None,database_file=None,
+                 min_poll_interval=.25,dense_period=10,backoff=1.5):
+        """
+        Polls every `min_poll_interval` seconds for the first `dense_period` seconds, then backs off geometrically by
+        `backoff` to polling every `poll_interval` seconds.  Whenever the process tree changes, but at most once every
+        `dense_period` seconds, the backoff restarts from `min_poll_interval`.
+        """
         def add_quotes(arg):
             "quotes get stripped off by the shell when it interprets the command, so this adds them back in"
             if re.search("\s",arg):
@@ -55,10 +120,36 @@ class Profile:
             else: return arg
         self.command = ' '.join(map(add_quotes, command))
         self.poll_interval = poll_interval
+        self.min_poll_interval = min(min_poll_interval, poll_interval)
+        self.dense_period = dense_period
+        self.backoff = backoff
         self.output_file = output_file
         self.database_file = database_file
+
+        #Offsets of the /proc/pid/stat fields to get, the rest come from /proc/pid/status
+        fields = self.fields_to_get['UPDATE'] + self.fields_to_get['INSERT']
+        self.stat_offsets = [(f, STAT_COLUMNS[f] - 2) for f in fields if f in STAT_COLUMNS]
+        self.status_fields = set(f for f in fields if f not in STAT_COLUMNS) | set(['Name'])
+
+        #Running aggregates of the INSERT fields summed over each poll's processes (a cross section).  Sums and counts
+        #are weighted by the seconds until the next poll, so averages aren't skewed towards densely polled periods
+        self.cross_section_max = {}
+        self.cross_section_sum = {}
+        self.cross_section_count = {}
+        self.num_polls = None #the number of polls that found processes
+        self.max_num_processes = None #the most processes found in one poll
+        #pid -> (Name, {UPDATE field: latest value})
+        self.processes = {}
+
+        #Every sample is only stored in SQLite when debugging
+        self.c = None
+        if database_file is not None:
+            self._setup_database(database_file)
         
-        #Setup SQLite
+        #setup logging
+        self.log=logging
+
+    def _setup_database(self, database_file):
         if os.path.exists(database_file):
             os.unlink(database_file)
         self.conn = sqlite3.connect(database_file)
@@ -72,9 +163,6 @@ class Profile:
         update_fields = self.fields_to_get['UPDATE']
         sqfields = ', '.join(map(lambda x: x + ' INTEGER', update_fields))
         self.c.execute("CREATE TABLE process (pid INTEGER PRIMARY KEY, poll_number INTEGER, name TEXT, {0})".format(sqfields))
-        
-        #setup logging
-        self.log=logging
 
     def _unnest(self,a_list):
         """
@@ -86,20 +174,9 @@ class Profile:
         """
         return [ item for items in a_list for item in items ]
 
-    def get_children(self,pid):
-        "returns a list of this pid's children"
-        p = subprocess.Popen('/bin/ps h --ppid {0} -o pid'.format(pid).split(' '),shell=False,stdout=subprocess.PIPE)
-        children = map(lambda x: x.strip(),filter(lambda x: x!='',p.communicate()[0].strip().split('\n')))
-        return children
-    
     def and_descendants(self,pid):
         "Returns a list of this pid and all of its descendant process (children's children, etc) ids"
-        children = self.get_children(pid)
-        
-        if len(children) == 0:
-            return [pid]
-        else: 
-            return [pid] + self._unnest([ self.and_descendants(int(child)) for child in children ])
+        return walk_proc(pid, []).keys()
     
     def run(self):
         """
@@ -107,60 +184,99 @@ class Profile:
         """
         #self.proc = subprocess.Popen(self.command,shell=True)
         self.proc = subprocess.Popen(["/bin/bash",self.command])
+        interval = self.min_poll_interval
+        densified_at = start_time
+        pids = None
         while True:
-            self.poll_all_procs(pids=self.all_pids)
-            
-            time.sleep(self.poll_interval)
+            procs = self.all_procs
+            if pids is not None and set(procs) != pids and time.time() - densified_at >= self.dense_period:
+                interval, densified_at = self.min_poll_interval, time.time()
+            pids = set(procs)
+            self.poll_all_procs(procs=procs, weight=interval)
+
+            self.wait(interval)
             if self.proc.poll() != None:
                 self.finish()
+            if time.time() - start_time >= self.dense_period:
+                interval = min(interval * self.backoff, self.poll_interval)
+
+    def wait(self, seconds):
+        """Sleeps for `seconds`, or until self.proc has finished"""
+        end = time.time() + seconds
+        while self.proc.poll() == None and time.time() < end:
+            time.sleep(min(self.min_poll_interval, end - time.time()))
     
     def parseVal(self,val):
         "Remove kB and return ints."
         return int(val) if val[-2:] != 'kB' else int(val[0:-3])
         
-    def poll_all_procs(self,pids):
-        """Updates the sql table with all descendant processes' resource usage"""
+    def poll_all_procs(self,procs,weight=1):
+        """
+        Adds all descendant processes' resource usage to the running aggregates
+
+        :param procs: {pid: [(field_name, value), ...]} of the /proc/pid/stat fields to get, see :attr:`all_procs`
+        :param weight: the seconds until the next poll
+        """
         self.poll_number = self.poll_number + 1
-        for pid in pids:
+        cross_section = {}
+        num_processes = 0
+        for pid, stat in procs.items():
             try:
-                all_stats = self.read_proc_stat(pid)
-                all_stats += self.read_proc_status(pid)
-                #Inserts
-                inserts = [ (name,self.parseVal(val)) for name,val in all_stats if name in self.fields_to_get['INSERT'] ] + [('pid',pid),('poll_number',self.poll_number)]
-                keys,vals = zip(*inserts) #unzip
-                q = "INSERT INTO record ({keys}) values({s})".format(s = ','.join(['?']*len(vals)),
-                                                                     keys = ', '.join(keys))
-                self.c.execute(q,vals)
-                #Updates
-                proc_name = filter(lambda x: x[0]=='Name' ,all_stats)[0][1]
-                updates = [ (name,self.parseVal(val)) for name,val in all_stats if name in self.fields_to_get['UPDATE'] ] + [('pid',pid),('Name',proc_name),('poll_number',self.poll_number)]
-                keys,vals = zip(*updates) #unzip
-                q = "INSERT OR REPLACE INTO process ({keys}) values({s})".format(s = ','.join(['?']*len(vals)),
-                                                                     keys = ', '.join(keys))
-                self.c.execute(q,vals)
-                
+                all_stats = stat + self.read_proc_status(pid)
             except IOError:
-                pass # process finished before file could be read
-                 
-        
+                continue # process finished before file could be read
+            num_processes += 1
+            stats = dict(all_stats)
+            for name in self.fields_to_get['INSERT']:
+                if name in stats:
+                    cross_section[name] = cross_section.get(name, 0) + stats[name]
+            self.processes[pid] = (stats['Name'], dict((name, stats[name]) for name in self.fields_to_get['UPDATE']
+                                                       if name in stats))
+            if self.c is not None:
+                self._insert_records(pid, all_stats)
+
+        if num_processes:
+            self.num_polls = self.poll_number
+            self.max_num_processes = max(self.max_num_processes, num_processes)
+            for name, total in cross_section.items():
+                self.cross_section_max[name] = max(self.cross_section_max.get(name, total), total)
+                self.cross_section_sum[name] = self.cross_section_sum.get(name, 0) + total * weight
+                self.cross_section_count[name] = self.cross_section_count.get(name, 0) + weight
+
+    def _insert_records(self, pid, all_stats):
+        """Stores a process' resource usage in the sql tables, for debugging"""
+        #Inserts
+        inserts = [ (name,val) for name,val in all_stats if name in self.fields_to_get['INSERT'] ] + [('pid',pid),('poll_number',self.poll_number)]
+        keys,vals = zip(*inserts) #unzip
+        q = "INSERT INTO record ({keys}) values({s})".format(s = ','.join(['?']*len(vals)),
+                                                             keys = ', '.join(keys))
+        self.c.execute(q,vals)
+        #Updates
+        proc_name = filter(lambda x: x[0]=='Name' ,all_stats)[0][1]
+        updates = [ (name,val) for name,val in all_stats if name in self.fields_to_get['UPDATE'] ] + [('pid',pid),('Name',proc_name),('poll_number',self.poll_number)]
+        keys,vals = zip(*updates) #unzip
+        q = "INSERT OR REPLACE INTO process ({keys}) values({s})".format(s = ','.join(['?']*len(vals)),
+                                                             keys = ', '.join(keys))
+        self.c.execute(q,vals)
+
     def read_proc_stat(self,pid):
         """
-        :returns: (field_name,value) from /proc/pid/stat or None if its empty
+        :returns: (field_name,value) of the fields to get from /proc/pid/stat
         """
-        stat_fields = read_man_proc.get_stat_and_status_fields()
-        with open('/proc/{0}/stat'.format(pid),'r') as f:
-            stat_all = f.readline().split(' ')
-            return map(lambda x: (x[0][0],x[1]),zip(stat_fields,stat_all))
+        return read_stat(pid, self.stat_offsets)[1]
         
     def read_proc_status(self,pid):
         """
-        :returns: (field_name,value) from /proc/pid/status or None if its empty
+        :returns: (field_name,value) of the fields to get from /proc/pid/status, with values parsed except for Name
         """
-        def line2tuple(l):
-            m = re.search(r"\s*(.+):\s*(.+)\s*",l)
-            return m.group(1),m.group(2)
+        fields = []
         with open('/proc/{0}/status'.format(pid),'r') as f:
-            return map(line2tuple,f.readlines())
+            for line in f:
+                name, _, val = line.partition(':')
+                if name in self.status_fields:
+                    val = val.strip()
+                    fields.append((name, val if name == 'Name' else self.parseVal(val)))
+        return fields
         
         
     def analyze_records(self):
@@ -168,63 +284,23 @@ class Profile:
         Summarizes and aggregates all the resource usage of self.all_pids
         :returns: a dictionary of profiled statistics
         """
-        #aggregate and summarize all the polls
-        self.c.execute("""
-            --average and max of cross sections at each poll
-            SELECT
-                num_polls,
-                num_processes,
-                MAX(FDSize) as max_fdsize, AVG(FDSize) as avg_fdsize, 
-                MAX(VmSize) as max_virtual_mem, AVG(VmSize) as avg_virtual_mem, 
-                MAX(VmLck) as max_locked_mem, AVG(VmLck) as avg_locked_mem, 
-                MAX(VmRSS) as max_rss_mem, AVG(VmRSS) as avg_rss_mem, 
-                MAX(VmData) as max_data_mem, AVG(VmData) as avg_data_mem, 
-                MAX(VmLib) as max_lib_mem, AVG(VmLib) as avg_lib_mem, 
-                MAX(VmPTE) as max_pte_mem, AVG(VmPTE) as avg_pte_mem,
-                MAX(num_threads) as max_num_threads, AVG(num_threads) as avg_num_threads
-            FROM
-            --sum up resource usage of all processes at each poll (=1 cross section)
-            (SELECT
-                Max(poll_number) as num_polls,
-                Count(pid) as num_processes,
-                SUM(FDSize) as FDSize, 
-                SUM(VmSize) as VmSize,
-                SUM(VmRSS) as VmRSS, 
-                SUM(VmLck) as VmLck, 
-                SUM(VmData) as VmData, 
-                SUM(VmLib) as VmLib,  
-                SUM(VmPTE) as VmPTE, 
-                SUM(num_threads) as num_threads,
-                SUM(FDSize) as FDSize
-            FROM record
-            GROUP BY poll_number )
-            """)
-        keys = [ x[0] for x in self.c.description]
-        profiled_inserts = zip(keys,self.c.next())
-        
-        #Summarize the updates
-        self.c.execute("""
-            SELECT
-                group_concat(name) as names,
-                group_concat(pid) as pids,
-                SUM(delayacct_blkio_ticks) as block_io_delays,
-                SUM(utime) as user_time,
-                SUM(stime) as system_time,
-                SUM(majflt) as major_page_faults,
-                SUM(minflt) as minor_page_faults,
-                MAX(VmPeak) as single_proc_max_peak_virtual_mem,
-                MAX(VmHWM) as single_proc_max_peak_rss,
-                SUM(voluntary_ctxt_switches) as voluntary_context_switches,
-                SUM(nonvoluntary_ctxt_switches) as nonvoluntary_context_switches
-            FROM process
-            """)
-        
-        keys = [ x[0] for x in self.c.description]
-        profiled_updates = zip(keys,self.c.next())
-        
-#        self.c.execute("SELECT * FROM process")
-#        keys = [ x[0] for x in self.c.description]
-#        self.log.debug([dict(zip(keys,vals)) for vals in self.c])
+        #average and max of cross sections at each poll
+        profiled_inserts = [('num_polls', self.num_polls), ('num_processes', self.max_num_processes)]
+        for field, stat in self.insert_stats.items():
+            count = self.cross_section_count.get(field)
+            profiled_inserts += [('max_' + stat, self.cross_section_max.get(field)),
+                                 ('avg_' + stat, float(self.cross_section_sum[field]) / count if count else None)]
+
+        #summarize the latest values of each process
+        processes = sorted(self.processes.items())
+        profiled_updates = [('names', ','.join(name for _, (name, _) in processes) or None),
+                            ('pids', ','.join(str(pid) for pid, _ in processes) or None)]
+        for stat, field in self.update_sums.items():
+            values = [updates[field] for _, (_, updates) in processes if field in updates]
+            profiled_updates.append((stat, sum(values) if values else None))
+        for stat, field in self.update_maxes.items():
+            values = [updates[field] for _, (_, updates) in processes if field in updates]
+            profiled_updates.append((stat, max(values) if values else None))
         
         profiled_procs = dict(profiled_inserts + profiled_updates)
         SC_CLK_TCK = os.sysconf(os.sysconf_names['SC_CLK_TCK'])
@@ -244,6 +320,8 @@ class Profile:
     def finish(self):
         """Executed when self.proc has finished"""
         result = self.analyze_records()
+        if self.c is not None:
+            self.conn.commit()
         if self.output_file != None:
             self.output_file.write(json.dumps(result,indent=4,sort_keys=True))
         else:
@@ -255,8 +333,11 @@ if __name__ == '__main__':
     #Argparse
     parser = argparse.ArgumentParser(description='Process some integers.')
     parser.add_argument('-f', '--file', type=argparse.FileType('w'), help='File to store output of profile to.')
-    parser.add_argument('-i', '--interval', type=int, default=30, help='How often to poll the resource usage information in /proc, in seconds.')
-    parser.add_argument('-db', '--dbfile', type=str, default=':memory:', help='File to store sqlite data to (default is in memory).  Will overwrite if the database already exists.')
+    parser.add_argument('-i', '--interval', type=float, default=30, help='The longest time between polls of the resource usage information in /proc, in seconds.')
+    parser.add_argument('--min_interval', type=float, default=.25, help='The time between polls at the start of the job, and after its process tree changes, in seconds.')
+    parser.add_argument('--dense_period', type=float, default=10, help='How long to poll every --min_interval seconds, before backing off to --interval.')
+    parser.add_argument('--backoff', type=float, default=1.5, help='The factor the time between polls grows by after the dense period.')
+    parser.add_argument('-db', '--dbfile', type=str, default=None, help='For debugging, a file to store every sample in as sqlite data (by default samples are only aggregated).  Will overwrite if the database already exists.')
     parser.add_argument('command', nargs=argparse.REMAINDER,help="The command to run. Required.")
     args = parser.parse_args()
     if len(args.command)==0:
@@ -264,7 +345,8 @@ if __name__ == '__main__':
         sys.exit(1)
 
     #Run Profile
-    profile = Profile(command=args.command,output_file=args.file,database_file=args.dbfile,poll_interval=args.interval)
+    profile = Profile(command=args.command,output_file=args.file,database_file=args.dbfile,poll_interval=args.interval,
+                      min_poll_interval=args.min_interval,dense_period=args.dense_period,backoff=args.backoff)
     try:
         result = profile.run()
     except KeyboardInterrupt:
@@ -50,6 +50,38 @@ class Base(declarative_base()):
     def query(self):
         return self.session.query(self.__class__)
 
+#: (table, column) pairs added to the models after their tables were first created.  create_all() leaves existing
+#: tables alone, so :func:`add_missing_columns` adds these to databases made by an older Cosmos.
+added_columns = [
+    ('execution', 'max_mem'),
+    ('task', 'skip_profile'),
+    ('task', 'command'),
+    ('task', 'drm_array_index'),
+    ('task', 'predict_reqs'),
+    ('task', 'input_size_kb'),
+]
+
+
+def add_missing_columns(engine):
+    """
+    Adds the columns in :data:`added_columns` that the tables in an existing database are missing.
+
+    :param engine: the sqlalchemy engine of the database.
+    :returns: (list) the (table, column) pairs that were added.
+    """
+    existing_tables = inspect(engine).get_table_names()
+    added = []
+    for table, column in added_columns:
+        if table not in existing_tables:
+            continue
+        if column in [c['name'] for c in inspect(engine).get_columns(table)]:
+            continue
+        col = Base.metadata.tables[table].c[column]
+        engine.execute('ALTER TABLE %s ADD COLUMN %s %s' % (table, col.name, col.type.compile(dialect=engine.dialect)))
+        added.append((table, column))
+    return added
+
+
 class MetaData(Base):
     __tablename__ = 'metadata'
     id = Column(Integer, primary_key=True)
@@ -2,6 +2,8 @@
 # Task stuff
 #
 
+from collections import OrderedDict
+
 from ..util.helpers import groupby2
 from .. import TaskStatus
 
@@ -12,10 +14,54 @@ try:
 except ImportError:
     pygraphviz_available = False
 
+_layouts = OrderedDict()  # cache_key -> AGraph that has already been laid out
+_max_layouts = 20
+
+task_status2color = {TaskStatus.no_attempt: 'black',
+                     TaskStatus.waiting: 'gold1',
+                     TaskStatus.submitted: 'navy',
+                     TaskStatus.successful: 'darkgreen',
+                     TaskStatus.failed: 'darkred',
+                     TaskStatus.killed: 'darkred'}
+
+
+def _cached_layout(cache_key, to_agraph, update_nodes):
+    """
+    Laying out a graph with dot is by far the slowest part of drawing it.  If `cache_key` was seen before, the graph
+    is assumed to have the same nodes and edges, so the old layout is reused and only the node attributes that
+    depend on status are updated.
+
+    :param cache_key: A hashable that changes when the graph does, ie. (execution.id, execution.graph_version), or
+        None to always lay out the graph.
+    :param func to_agraph: Returns a new AGraph.
+    :param func update_nodes: Updates the attributes of the nodes of an AGraph.
+    :returns: An AGraph with a layout.
+    """
+    if cache_key is not None and cache_key in _layouts:
+        a = _layouts[cache_key]
+        update_nodes(a)
+        return a
 
-def draw_task_graph(task_graph, save_to=None, format='svg'):
-    a = taskgraph_to_agraph(task_graph, False)
+    a = to_agraph()
     a.layout('dot')
+    if cache_key is not None:
+        _layouts[cache_key] = a
+        if len(_layouts) > _max_layouts:
+            _layouts.popitem(last=False)
+    return a
+
+
+def draw_task_graph(task_graph, save_to=None, format='svg', cache_key=None):
+    """
+    :param cache_key: See :func:`_cached_layout`.
+    """
+
+    def update_nodes(a):
+        for task in task_graph.nodes():
+            a.get_node(task).attr['color'] = task_status2color.get(task.status, 'black')
+
+    a = _cached_layout(('task', cache_key) if cache_key is not None else None,
+                       lambda: taskgraph_to_agraph(task_graph, False), update_nodes)
     return a.draw(path=save_to, format=format)
 
 
@@ -42,15 +88,8 @@ def taskgraph_to_agraph(task_graph, url=True):
                 return "{0}: {1}".format(kv[0], v)
 
             label = " \\n".join(map(truncate_val, task.tags.items()))
-            status2color = {TaskStatus.no_attempt: 'black',
-                            TaskStatus.waiting: 'gold1',
-                            TaskStatus.submitted: 'navy',
-                            TaskStatus.successful: 'darkgreen',
-                            TaskStatus.failed: 'darkred',
-                            TaskStatus.killed: 'darkred'}
-
             sg.add_node(task, label=label, URL=task.url if url else '#', target="_blank",
-                        color=status2color.get(task.status, 'black'))
+                        color=task_status2color.get(task.status, 'black'))
 
     return agraph
 
@@ -68,9 +107,25 @@ from .. import RelationshipType
 from ..models.Stage import StageStatus
 
 
-def draw_stage_graph(stage_graph, save_to=None, url=False, format='svg'):
-    g = stagegraph_to_agraph(stage_graph, url=url)
-    g.layout(prog="dot")
+stage_status2color = {StageStatus.no_attempt: 'black',
+                      StageStatus.running: 'navy',
+                      StageStatus.successful: 'darkgreen',
+                      StageStatus.failed: 'darkred'}
+
+
+def draw_stage_graph(stage_graph, save_to=None, url=False, format='svg', cache_key=None):
+    """
+    :param cache_key: See :func:`_cached_layout`.
+    """
+
+    def update_nodes(g):
+        for stage in stage_graph.nodes():
+            node = g.get_node(stage)
+            node.attr['color'] = stage_status2color.get(getattr(stage, 'status', None), 'black')
+            node.attr['label'] = stage.label
+
+    g = _cached_layout(('stage', url, cache_key) if cache_key is not None else None,
+                       lambda: stagegraph_to_agraph(stage_graph, url=url), update_nodes)
     return g.draw(path=save_to, format=format)
 
 
@@ -86,17 +141,13 @@ def stagegraph_to_agraph(stage_graph, url=True):
     agraph.node_attr['fontsize'] = 8
     agraph.edge_attr['fontcolor'] = '#586e75'
 
-    status2color = {StageStatus.no_attempt: 'black',
-                    StageStatus.running: 'navy',
-                    StageStatus.successful: 'darkgreen',
-                    StageStatus.failed: 'darkred'}
     rel2abbrev = {RelationshipType.one2one: 'o2o',
                   RelationshipType.one2many: 'o2m',
                   RelationshipType.many2one: 'm2o',
                   RelationshipType.many2many: 'm2m'}
 
     for stage in stage_graph.nodes():
-        agraph.add_node(stage, color=status2color.get(getattr(stage, 'status', None), 'black'),
+        agraph.add_node(stage, color=stage_status2color.get(getattr(stage, 'status', None), 'black'),
                         URL=stage.url if url else '', label=stage.label)
 
     for u, v in stage_graph.edges():
@@ -0,0 +1,273 @@
+import heapq
+import itertools as it
+import time
+from collections import Counter, OrderedDict
+
+import networkx as nx
+
+#: Available scheduling policies, which decide the order ready Tasks are submitted in
+SCHEDULERS = ['cpu_req', 'critical_path']
+
+
+def critical_path_lengths(task_graph, expected_runtime):
+    """
+    :param networkx.DiGraph task_graph: A DAG of Tasks.
+    :param func expected_runtime: Returns the expected runtime of a Task.
+    :returns: (dict) Task -> the expected runtime of the longest path from the Task to the end of the graph,
+        including the Task itself.
+    """
+    lengths = dict()
+    for task in reversed(list(nx.topological_sort(task_graph))):
+        lengths[task] = expected_runtime(task) + max([lengths[c] for c in task_graph.successors(task)] or [0])
+    return lengths
+
+
+class _MinCounter(object):
+    """
+    Counts values, and finds the smallest one with a count in amortized O(log n).
+    """
+
+    def __init__(self):
+        self._counts = Counter()  # has a key for every value on the heap
+        self._heap = []  # values, with those whose count dropped to zero removed lazily
+
+    def add(self, value):
+        if value not in self._counts:
+            heapq.heappush(self._heap, value)
+        self._counts[value] += 1
+
+    def remove(self, value):
+        self._counts[value] -= 1
+
+    def min(self):
+        """
+        :returns: The smallest value with a count, or 0 if there are none.
+        """
+        while self._heap and self._counts[self._heap[0]] <= 0:
+            del self._counts[heapq.heappop(self._heap)]
+        return self._heap[0] if self._heap else 0
+
+
+class TaskQueue(object):
+    """
+    The Tasks of an Execution that have not finished yet.
+
+    Keeps a count of each Task's unfinished parents, which is decremented as parents finish, and a heap of the Tasks
+    that are ready to be submitted.  Scheduling passes only touch the Tasks that became ready, rather than rescanning
+    the whole task graph.
+    """
+
+    #: Seconds a ready Task may be passed over by smaller ones that fit, before resources are reserved for it
+    reserve_after = 300
+
+    def __init__(self, task_graph, priorities=None, on_ready=None):
+        """
+        :param networkx.DiGraph task_graph: A DAG of the Tasks that still have to run.
+        :param dict priorities: Task -> sort key.  Ready Tasks with the lowest key are submitted first.
+            Defaults to each Task's cpu_req.
+        :param func on_ready: Called with each Task when it becomes ready, before its priority and resources are
+            looked at, ie. to set its reqs.
+        """
+        self._priorities = priorities
+        self._on_ready = on_ready
+        self._children = {task: list(task_graph.successors(task)) for task in task_graph.nodes()}
+        self._num_parents = dict(task_graph.in_degree())
+        self._ready = []  # heap of (priority, counter, Task)
+        self._counter = it.count()  # breaks priority ties in the order tasks became ready
+        self._ready_since = OrderedDict()  # ready Task -> (its heap entry, when it became ready), in that order
+        self._removed = set()  # counters of heap entries whose Task was popped out of priority order
+        self._cpu_reqs = _MinCounter()  # cpu_reqs of the ready Tasks
+        self._mem_reqs = _MinCounter()  # mem_reqs of the ready Tasks
+        #: The sum of cpu_req of the Tasks that have been submitted, but have not finished yet
+        self.cores_used = 0
+        #: The sum of mem_req of the Tasks that have been submitted, but have not finished yet
+        self.mem_used = 0
+        #: resource -> total seconds ready Tasks have spent waiting for that resource to free up
+        self.blocked_time = dict(cpu=0.0, mem=0.0)
+        self._waiting_for = ()  # the resources the last pass ran out of
+        self._num_blocked = 0
+        self._last_pass = time.time()
+
+        for task, num_parents in self._num_parents.items():
+            if num_parents == 0:
+                self._push_ready(task)
+
+    def __len__(self):
+        return len(self._num_parents)
+
+    def __iter__(self):
+        return iter(self._num_parents)
+
+    def __contains__(self, task):
+        return task in self._num_parents
+
+    def _push_ready(self, task):
+        if self._on_ready is not None:
+            self._on_ready(task)
+        priority = task.cpu_req if self._priorities is None else self._priorities[task]
+        self._push_entry((priority, next(self._counter), task), time.time())
+
+    def _push_entry(self, entry, ready_since):
+        heapq.heappush(self._ready, entry)
+        self._ready_since[entry[-1]] = (entry, ready_since)
+        self._cpu_reqs.add(entry[-1].cpu_req)
+        self._mem_reqs.add(entry[-1].mem_req or 0)
+
+    def _pop_entry(self, entry=None):
+        """
+        Removes `entry` from the ready Tasks, or the entry with the highest priority if it's None.
+
+        :returns: (entry, time its Task became ready)
+        """
+        if entry is None:
+            self._drop_removed()
+            entry = heapq.heappop(self._ready)
+        else:
+            # left on the heap, and skipped when it gets to the top
+            self._removed.add(entry[1])
+        task = entry[-1]
+        self._cpu_reqs.remove(task.cpu_req)
+        self._mem_reqs.remove(task.mem_req or 0)
+        return self._ready_since.pop(task)
+
+    def _drop_removed(self):
+        while self._ready and self._ready[0][1] in self._removed:
+            self._removed.remove(heapq.heappop(self._ready)[1])
+
+    def peek_ready(self):
+        """
+        :returns: The next Task to submit, or None if no Tasks are ready.
+        """
+        self._drop_removed()
+        return self._ready[0][-1] if self._ready else None
+
+    def pop_ready(self):
+        """
+        Removes the next Task to submit from the ready heap, and counts its cores and memory as used.
+
+        :returns: A Task.
+        """
+        task = self._pop_entry()[0][-1]
+        self._take_resources(task)
+        return task
+
+    def pop_ready_within(self, max_cpus=None, max_mem=None):
+        """
+        Packs ready Tasks, in priority order, into the cores and memory that are free.  Tasks that do not fit stay on
+        the ready heap, and the time they spend waiting is added to :attr:`blocked_time`.
+
+        Smaller Tasks are submitted past one that does not fit, but once a Task has been ready for
+        :attr:`reserve_after` seconds it goes first, and if it does not fit either, nothing else is submitted until
+        it does.  The scan stops as soon as the free cores or memory are less than any Task left needs, so a pass
+        where nothing can be submitted doesn't touch every ready Task.
+
+        :param int max_cpus: The maximum sum of cpu_req of running Tasks, or None for no limit.
+        :param int max_mem: The maximum sum of mem_req of running Tasks, or None for no limit.
+        :yields: Tasks to submit.  Their resources are counted as used.
+        """
+        now = time.time()
+        for resource in self._waiting_for:
+            self.blocked_time[resource] += self._num_blocked * (now - self._last_pass)
+        skipped = []
+        waiting_for = set()
+        try:
+            # Tasks that have waited too long go first, in the order they became ready
+            while self._ready_since:
+                entry, ready_since = next(self._ready_since.itervalues())
+                if now - ready_since < self.reserve_after:
+                    break
+                blocked_on = self._blocked_on(entry[-1], max_cpus, max_mem)
+                if blocked_on:
+                    # reserve the resources it's waiting for
+                    waiting_for.update(blocked_on)
+                    return
+                self._pop_entry(entry)
+                self._take_resources(entry[-1])
+                yield entry[-1]
+
+            while self._ready_since:
+                blocked_on = self._blocked_on(None, max_cpus, max_mem)
+                if blocked_on:
+                    # none of the Tasks left fit
+                    waiting_for.update(blocked_on)
+                    break
+                entry, ready_since = self._pop_entry()
+                blocked_on = self._blocked_on(entry[-1], max_cpus, max_mem)
+                if blocked_on:
+                    waiting_for.update(blocked_on)
+                    skipped.append((entry, ready_since))
+                else:
+                    self._take_resources(entry[-1])
+                    yield entry[-1]
+        finally:
+            for entry, ready_since in skipped:
+                self._push_entry(entry, ready_since)
+            self._waiting_for = tuple(sorted(waiting_for))
+            self._num_blocked = len(self._ready_since) if waiting_for else 0
+            self._last_pass = now
+
+    def _blocked_on(self, task, max_cpus, max_mem):
+        """
+        :param task: A Task, or None for the smallest reqs of the ready Tasks that are still on the heap.
+        :returns: (list) The resources there isn't enough of for `task`.
+        """
+        cpu_req = self._cpu_reqs.min() if task is None else task.cpu_req
+        mem_req = self._mem_reqs.min() if task is None else task.mem_req or 0
+        blocked_on = []
+        if max_cpus is not None and self.cores_used + cpu_req > max_cpus:
+            blocked_on.append('cpu')
+        if max_mem is not None and self.mem_used + mem_req > max_mem:
+            blocked_on.append('mem')
+        return blocked_on
+
+    @property
+    def num_blocked(self):
+        """The number of ready Tasks that were left waiting for resources to free up by the last pass"""
+        return self._num_blocked
+
+    def _take_resources(self, task):
+        self.cores_used += task.cpu_req
+        self.mem_used += task.mem_req or 0
+
+    def _release_resources(self, task):
+        self.cores_used -= task.cpu_req
+        self.mem_used -= task.mem_req or 0
+
+    def requeue(self, task):
+        """
+        Puts a submitted Task back on the ready heap, ie. when it is being reattempted.
+        """
+        self._release_resources(task)
+        self._push_ready(task)
+
+    def finished(self, task):
+        """
+        Removes a successful Task.  Its children that no longer have unfinished parents become ready.
+        """
+        self._release_resources(task)
+        del self._num_parents[task]
+        for child in self._children.pop(task):
+            if child not in self._num_parents:
+                # removed because another of its parents failed
+                continue
+            self._num_parents[child] -= 1
+            if self._num_parents[child] == 0:
+                self._push_ready(child)
+
+    def failed(self, task):
+        """
+        Removes a failed Task and all of its descendants, which can now never run.
+
+        :returns: The number of Tasks removed.
+        """
+        self._release_resources(task)
+        removed = 0
+        stack = [task]
+        while stack:
+            t = stack.pop()
+            if t in self._num_parents:
+                del self._num_parents[t]
+                stack.extend(self._children.pop(t))
+                removed += 1
+        # descendants can't be on the ready heap, since `task` never succeeded
+        return removed
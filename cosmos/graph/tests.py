@@ -0,0 +1,95 @@
+import time
+import unittest
+
+import networkx as nx
+
+from cosmos.graph.taskqueue import TaskQueue
+
+
+class FakeTask(object):
+    def __init__(self, name, cpu_req=1, mem_req=None):
+        self.name = name
+        self.cpu_req = cpu_req
+        self.mem_req = mem_req
+
+    def __repr__(self):
+        return self.name
+
+
+def make_queue(tasks, edges=()):
+    g = nx.DiGraph()
+    g.add_nodes_from(tasks)
+    g.add_edges_from(edges)
+    return TaskQueue(g)
+
+
+class Test_TaskQueue(unittest.TestCase):
+    def test_pop_ready_within_limits(self):
+        tasks = [FakeTask('a', 1, 100), FakeTask('b', 2, 100), FakeTask('c', 1, 300)]
+        q = make_queue(tasks)
+        popped = list(q.pop_ready_within(max_cpus=3, max_mem=250))
+        self.assertEqual(sorted(t.name for t in popped), ['a', 'b'])
+        self.assertEqual((q.cores_used, q.mem_used), (3, 200))
+        self.assertEqual(q.num_blocked, 1)
+
+    def test_blocked_when_cores_exactly_full(self):
+        q = make_queue([FakeTask('a'), FakeTask('b'), FakeTask('c')])
+        self.assertEqual(len(list(q.pop_ready_within(max_cpus=1))), 1)
+        self.assertEqual(q.cores_used, 1)
+
+        # the cores are exactly used up, the Tasks left are still waiting on them
+        self.assertEqual(list(q.pop_ready_within(max_cpus=1)), [])
+        self.assertEqual(q.num_blocked, 2)
+        time.sleep(.1)
+        self.assertEqual(list(q.pop_ready_within(max_cpus=1)), [])
+        self.assertGreater(q.blocked_time['cpu'], .1)
+        self.assertEqual(q.blocked_time['mem'], 0)
+
+    def test_zero_cpu_tasks_run_when_cores_full(self):
+        q = make_queue([FakeTask('a'), FakeTask('b'), FakeTask('input', cpu_req=0)])
+        popped = [t.name for t in q.pop_ready_within(max_cpus=1)]
+        # a and b tie, so either one runs
+        self.assertEqual(len(popped), 2)
+        self.assertIn('input', popped)
+        self.assertEqual(q.num_blocked, 1)
+
+    def test_pass_stops_when_nothing_fits(self):
+        q = make_queue([FakeTask(str(i), cpu_req=2) for i in range(100)])
+        self.assertEqual(len(list(q.pop_ready_within(max_cpus=3))), 1)
+        examined = []
+        blocked_on = q._blocked_on
+        q._blocked_on = lambda task, *args: examined.append(task) or blocked_on(task, *args)
+        self.assertEqual(list(q.pop_ready_within(max_cpus=3)), [])
+        self.assertEqual(examined, [None])
+        self.assertEqual(q.num_blocked, 99)
+
+    def test_reserve_for_task_waiting_too_long(self):
+        big, s1, s2, s3, s4 = [FakeTask('big', cpu_req=4)] + [FakeTask('s%s' % i) for i in range(1, 5)]
+        q = make_queue([big, s1, s2, s3, s4], [(s1, s3), (s2, s4)])
+        self.assertEqual(set(q.pop_ready_within(max_cpus=4)), {s1, s2})
+
+        # smaller Tasks are submitted past it
+        q.finished(s1)
+        self.assertEqual(list(q.pop_ready_within(max_cpus=4)), [s3])
+
+        # until it has waited reserve_after seconds, then it holds the cores that free up
+        q.reserve_after = 0
+        q.finished(s2)
+        self.assertEqual(list(q.pop_ready_within(max_cpus=4)), [])
+        self.assertEqual(q.num_blocked, 2)
+        q.finished(s3)
+        self.assertEqual(list(q.pop_ready_within(max_cpus=4)), [big])
+        self.assertEqual(q.num_blocked, 1)
+
+    def test_finished_after_sibling_failed(self):
+        a, b, child = FakeTask('a'), FakeTask('b'), FakeTask('child')
+        q = make_queue([a, b, child], [(a, child), (b, child)])
+        self.assertEqual(len(list(q.pop_ready_within())), 2)
+        self.assertEqual(q.failed(a), 2)
+        q.finished(b)
+        self.assertEqual(len(q), 0)
+        self.assertEqual(list(q.pop_ready_within()), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -11,7 +11,7 @@ from flask import url_for
 import networkx as nx
 from networkx.algorithms.dag import descendants, topological_sort
 import atexit
-from ..util.iterstuff import only_one
+from ..util.iterstuff import only_one, chunked
 import sys
 
 from ..util.helpers import duplicates, groupby2
@@ -19,6 +19,7 @@ from ..db import Base
 import time
 import itertools as it
 import datetime
+from collections import Counter
 
 opj = os.path.join
 import signal
@@ -26,7 +27,12 @@ import signal
 from .. import TaskStatus, StageStatus, Task, ExecutionStatus, signal_execution_status_change
 
 from ..util.helpers import get_logger
-from ..util.sqla import Enum34_ColumnType, MutableDict, JSONEncodedDict, get_or_create
+from ..util.sqla import Enum34_ColumnType, MutableDict, JSONEncodedDict, get_or_create, bulk_insert_new, \
+    LazyInstanceList
+from ..util.stats import timed
+from ..util.advisor import ResourceAdvisor
+from ..graph.taskqueue import TaskQueue, SCHEDULERS, critical_path_lengths
+from .Task import set_task_statuses
 
 
 def _default_task_log_output_dir(task):
@@ -54,7 +60,7 @@ def _execution_status_changed(ex):
         ex.successful = True
         ex.finished_on = datetime.datetime.now()
 
-    ex.session.commit()
+    ex.commit_or_defer()
 
 
 class Execution(Base):
@@ -72,6 +78,7 @@ class Execution(Base):
     started_on = Column(DateTime)
     finished_on = Column(DateTime)
     max_cpus = Column(Integer)
+    max_mem = Column(Integer)
     max_attempts = Column(Integer, default=1)
     info = Column(MutableDict.as_mutable(JSONEncodedDict))
     # recipe_graph = Column(PickleType)
@@ -116,6 +123,12 @@ class Execution(Base):
         self.jobmanager = None
         self.created_on = datetime.datetime.now()
         self._task_references_to_stop_garbage_collection_which_destroys_tool_attribute = []
+        self._graphs = dict()
+        self._commit_interval = None  # set while Execution.run is writing status changes behind
+        self._commit_pending = False
+        self._last_commit = time.time()
+        #: phase -> seconds the last :meth:`run` spent in it, and the number of scheduler `passes`
+        self.run_stats = Counter()
 
     def __getattr__(self, item):
         if item == 'log':
@@ -124,19 +137,88 @@ class Execution(Base):
         else:
             raise AttributeError('%s is not an attribute of %s' % (item, self))
 
-    def add(self, tools, name=None):
+    def add(self, tools, name=None, chunk_size=None):
         """
         Add tools to the Stage with `name`.  If a Stage with `name` does not exist, create it.
 
         :param itrbl(tool) tools: For each tool in `tools`, new task will be added to the stage with stage `name`.
         :param str name: Default is to the class name of the first tool in tools.
-        :rtype: list(Task)
+        :param int chunk_size: If set, `tools` is consumed `chunk_size` tools at a time.  The Tasks of each chunk
+            have their commands rendered and are committed to the database before the next chunk is read, and only
+            their ids are kept, so memory use depends on `chunk_size` rather than on the number of tools.
+        :rtype: list(Task), or a :class:`LazyInstanceList` of Tasks if `chunk_size` is set
         :return: New tasks that were created.
         """
-        from .. import Tool, Stage
+        from .. import Tool
 
         if hasattr(tools, '__class__') and issubclass(tools.__class__, Tool):
             tools = [tools]
+        if chunk_size is not None:
+            return self._add_in_chunks(tools, name, chunk_size)
+
+        tools = self._validate_tools(tools)
+        if name is None:
+            name = tools[0].__class__.__name__
+
+        with self.session.no_autoflush:
+            stage = self._get_or_create_stage(name)
+            # successful because failed jobs have been deleted.
+            successful_tasks = {frozenset(t.tags.items()): t for t in stage.tasks}
+        new_tasks = self._add_to_stage(stage, tools, successful_tasks)
+
+        #todo temporary
+        for t in new_tasks:
+            assert hasattr(t, 'tool')
+
+        self._task_references_to_stop_garbage_collection_which_destroys_tool_attribute += new_tasks
+        self.invalidate_graphs()
+
+        return new_tasks
+
+    def _add_in_chunks(self, tools, name, chunk_size):
+        assert chunk_size > 0, '`chunk_size` must be greater than 0'
+        stage = None
+        successful_task_ids = None
+        seen_tags = set()
+        task_ids = LazyInstanceList(self.session, Task)
+
+        for chunk in chunked(tools, chunk_size):
+            chunk = self._validate_tools(chunk)
+            for tool in chunk:
+                tags = frozenset(tool.tags.items())
+                if tags in seen_tags:
+                    self.log.error('Duplicate tags detected: %s in %s.  Tags within a stage must be unique.' % (
+                        tool.tags, tool))
+                    raise ValueError('Duplicate tags detected')
+                seen_tags.add(tags)
+
+            if stage is None:
+                stage = self._get_or_create_stage(name or chunk[0].__class__.__name__)
+                successful_task_ids = {frozenset(tags.items()): id_ for id_, tags in
+                                       self.session.query(Task.id, Task.tags).filter(Task.stage == stage)}
+
+            successful_tasks = {tags: self.session.query(Task).get(successful_task_ids[tags])
+                                for tags in (frozenset(tool.tags.items()) for tool in chunk)
+                                if tags in successful_task_ids}
+            new_tasks = self._add_to_stage(stage, chunk, successful_tasks)
+            # the Tools are released with the chunk, so render commands while they're still around
+            for task in new_tasks:
+                if not task.successful:
+                    task.command = task.tool._generate_command(task)
+            self.session.commit()
+            task_ids.ids.extend(t.id for t in new_tasks)
+
+        assert stage is not None, '`tools` cannot be empty'
+        self.invalidate_graphs()
+        self.log.info('Added %s tasks to %s in chunks of %s' % (len(task_ids), stage, chunk_size))
+        return task_ids
+
+    def _validate_tools(self, tools):
+        """
+        :returns: (list) `tools`, without any that are None.
+        """
+        from .. import Tool
+
         tools = list(tools)
         assert isinstance(tools, list) and all(issubclass(t.__class__, Tool) for t in tools), \
             '`tools` must be a list of Tools, a Tool instance, or a generator of Tools'
@@ -147,9 +229,6 @@ class Execution(Base):
             for p in t.task_parents:
                 assert p.execution == self, "cannot add a tool who's parent tasks belong to a different execution"
 
-        if name is None:
-            name = tools[0].__class__.__name__
-
         for tags, tool_group in groupby2(tools, lambda tool: tool.tags):
             tool_group = list(tool_group)
             if len(tool_group) > 1:
@@ -159,7 +238,10 @@ class Execution(Base):
 
                 self.log.error(s)
                 raise ValueError('Duplicate tags detected')
+        return tools
 
+    def _get_or_create_stage(self, name):
+        from .. import Stage
 
         # stage, created = get_or_create(session=self.session, model=Stage, execution=self, name=name)
         try:
@@ -167,29 +249,30 @@ class Execution(Base):
         except ValueError:
             stage = Stage(execution=self, name=name)
         self.session.add(stage)
+        return stage
 
-        # successful because failed jobs have been deleted.
-        successful_tasks = {frozenset(t.tags.items()): t for t in stage.tasks}
-
-        new_parent_stages = set()
-        new_tasks = list()
-        for tool in tools:
-            new_parent_stages = new_parent_stages.union(p.stage for p in tool.task_parents)
-            task = get_or_create_task(tool, successful_tasks, tool.tags, stage, parents=tool.task_parents,
-                                      default_drm=self.cosmos_app.default_drm)
-            tool.task = task
-            new_tasks.append(task)
-        stage.parents += list(new_parent_stages.difference(stage.parents))
-
-        #todo temporary
-        for t in new_tasks:
-            assert hasattr(t, 'tool')
-
-        self._task_references_to_stop_garbage_collection_which_destroys_tool_attribute += new_tasks
-
+    def _add_to_stage(self, stage, tools, successful_tasks):
+        """
+        :param dict successful_tasks: frozenset(tags.items()) -> an existing successful Task of `stage`, which is
+            reused instead of creating a new Task for a tool with the same tags.
+        :returns: (list) the Task of each tool.
+        """
+        # don't autoflush while the graph is being built, so new objects stay pending until they're committed
+        with self.session.no_autoflush:
+            new_parent_stages = set()
+            new_tasks = list()
+            for tool in tools:
+                new_parent_stages = new_parent_stages.union(p.stage for p in tool.task_parents)
+                task = get_or_create_task(tool, successful_tasks, tool.tags, stage, parents=tool.task_parents,
+                                          default_drm=self.cosmos_app.default_drm)
+                tool.task = task
+                new_tasks.append(task)
+            stage.parents += list(new_parent_stages.difference(stage.parents))
+        stage.reset_task_counts()
         return new_tasks
 
-    def run(self, log_output_dir=_default_task_log_output_dir, dry=False, set_successful=True):
+    def run(self, log_output_dir=_default_task_log_output_dir, dry=False, set_successful=True, scheduler='cpu_req',
+            bulk_insert=False, commit_interval=None, array_jobs=False, bundles=None, resource_advisor=None):
         """
         Renders and executes the :param:`recipe`
 
@@ -200,20 +283,49 @@ class Execution(Base):
         :param dry: (bool) if True, do not actually run any jobs.
         :param set_successful: (bool) sets this execution as successful if all rendered recipe executes without a failure.  You might set this to False if you intend to add and
             run more tasks in this execution later.
+        :param scheduler: (str) the order ready tasks are submitted in.  `cpu_req` submits tasks with the smallest
+            cpu_req first.  `critical_path` submits tasks with the longest chain of work below them first, using
+            the average wall_time of successful tasks of the same stage name in previous executions.
+        :param bulk_insert: (bool) if True, persist new stages, tasks and taskfiles with one batched INSERT per table
+            instead of through the ORM's unit of work, which is much faster and leaner for very large workflows.
+        :param commit_interval: (float) if set, task, stage and execution status changes are written behind: they are
+            kept in the session and committed together at most every `commit_interval` seconds (0 commits once per
+            scheduler pass), rather than in a separate transaction for every change.  Pending changes are committed
+            on SIGINT and at exit.
+        :param array_jobs: (bool) if True, ready tasks of the same stage with the same submit args are submitted to LSF
+            or Grid Engine as a single array job rather than one job each.
+        :param bundles: (dict) stage name -> the number of its ready tasks to bundle into a single job, or a dict with
+            the keys `size` (the most tasks in a bundle), `time_req` (the most summed time_req of a bundle) and
+            `parallel` (how many tasks of a bundle run at once, at most the tasks' cpu_req).  For stages with many
+            tiny tasks, whose queueing overhead would dwarf their runtime.
+        :param resource_advisor: (ResourceAdvisor) predicts the reqs of tasks whose Tool sets `predict_reqs` when they
+            become ready, from the resource usage of past tasks of the same stage name.  Defaults to a ResourceAdvisor
+            with its default quantile and margin.
 
         """
+        assert scheduler in SCHEDULERS, 'unsupported scheduler: %s' % scheduler
         assert os.path.exists(os.getcwd()), 'current working dir does not exist! %s' % os.getcwd()
         assert hasattr(self, 'cosmos_app'), 'Execution was not initialized using the Execution.start method'
         assert hasattr(log_output_dir, '__call__'), 'log_output_dir must be a function'
         assert self.session, 'Execution must be part of a sqlalchemy session'
         session = self.session
+        self.run_stats = Counter()
+        run_started = time.time()
         self.log.info('Preparing to run %s using DRM `%s`, output_dir: `%s`' % (
             self, self.cosmos_app.default_drm, self.output_dir))
 
         from ..job.JobManager import JobManager
 
         self.jobmanager = JobManager(get_submit_args=self.cosmos_app.get_submit_args,
-                                     default_queue=self.cosmos_app.default_queue)
+                                     default_queue=self.cosmos_app.default_queue,
+                                     array_jobs=array_jobs,
+                                     bundles=bundles,
+                                     result_dir=opj(self.output_dir, 'log', '.results'))
+
+        if bulk_insert:
+            # before the status change below commits, which would flush everything through the unit of work
+            self.log.info('Bulk inserting %s new objects into the SQL database...' % len(session.new))
+            bulk_insert_new(session, self.log)
 
         self.status = ExecutionStatus.running
         self.successful = False
@@ -298,7 +410,8 @@ class Execution(Base):
 
         # commit so task.id is set for log dir
         self.log.info('Committing %s Tasks to the SQL database...' % (len(task_g.nodes()) - len(successful)))
-        session.commit()
+        with timed(self.run_stats, 'initial_commit'):
+            session.commit()
 
         # print stages
         for s in topological_sort(stage_g):
@@ -335,15 +448,37 @@ class Execution(Base):
 
         reset_stage_attrs()
 
-        self.log.info('Ensuring there are enough cores...')
-        # make sure we've got enough cores
+        self.log.info('Ensuring there are enough cores and memory...')
+        # make sure we've got enough cores and memory
         for t in task_queue:
             assert t.cpu_req <= self.max_cpus or self.max_cpus is None, '%s requires more cpus (%s) than `max_cpus` (%s)' % (
                 t, t.cpu_req, self.max_cpus)
+            assert (t.mem_req or 0) <= self.max_mem or self.max_mem is None, '%s requires more memory (%s) than `max_mem` (%s)' % (
+                t, t.mem_req, self.max_mem)
+
+        priorities = None
+        if scheduler == 'critical_path':
+            self.log.info('Computing critical paths...')
+            runtimes = self.expected_stage_runtimes()
+            default_runtime = sum(runtimes.values()) / len(runtimes) if runtimes else 1.0
+            lengths = critical_path_lengths(task_queue,
+                                            lambda t: runtimes.get(t.stage.name, default_runtime) if not t.NOOP else 0)
+            priorities = {task: -length for task, length in lengths.items()}
+
+        self.run_stats['prepare'] = time.time() - run_started
 
         # Run this thing!
         if not dry:
-            _run(self, session, task_queue)
+            self._commit_interval = commit_interval
+            try:
+                if resource_advisor is None:
+                    resource_advisor = ResourceAdvisor(session, max_cpus=self.max_cpus, max_mem=self.max_mem,
+                                                       log=self.log)
+                _run(self, session, TaskQueue(task_queue, priorities, on_ready=resource_advisor.advise))
+            finally:
+                self.jobmanager.close()
+                self._commit_interval = None
+                self.commit_deferred(force=True)
 
             # set status
             if self.status == ExecutionStatus.failed_but_running:
@@ -365,6 +500,35 @@ class Execution(Base):
         self.log.info('Execution complete')
 
 
+    def commit_or_defer(self):
+        """
+        Commits the session, unless status changes are being written behind (see the `commit_interval` parameter of
+        :meth:`run`), in which case the commit is left to :meth:`commit_deferred`.
+        """
+        if self._commit_interval is None:
+            self.session.commit()
+            self._last_commit = time.time()
+        else:
+            self._commit_pending = True
+
+    def commit_deferred(self, force=False):
+        """
+        Commits changes left by :meth:`commit_or_defer`, if `commit_interval` seconds have passed since the last commit.
+
+        :param bool force: commit pending changes no matter how long ago the last commit was.
+        """
+        if self._commit_pending and (force or self.seconds_until_commit == 0):
+            self.session.commit()
+            self._commit_pending = False
+            self._last_commit = time.time()
+
+    @property
+    def seconds_until_commit(self):
+        """Seconds until :meth:`commit_deferred` will commit pending changes, or None if nothing is pending"""
+        if not self._commit_pending:
+            return None
+        return max(0, (self._commit_interval or 0) - (time.time() - self._last_commit))
+
     def terminate(self, due_to_failure=True):
         self.log.warning('Terminating %s!' % self)
         if self.jobmanager:
@@ -398,24 +562,76 @@ class Execution(Base):
 
         return self.session.query(TaskFile).join(Task, Stage, Execution).filter(Execution.id == self.id)
 
+    @property
+    def graph_version(self):
+        """
+        Incremented every time Tasks or Stages are added to or deleted from this Execution.  Use it to key caches of
+        anything computed from :meth:`task_graph` or :meth:`stage_graph`, ie. rendered images of the graphs.
+        """
+        return self.info.get('graph_version', 0)
+
+    def invalidate_graphs(self):
+        """
+        Drops the cached :meth:`task_graph` and :meth:`stage_graph`, and increments :attr:`graph_version`.  Called
+        when Tasks or Stages are added or deleted.
+        """
+        self.info['graph_version'] = self.graph_version + 1
+        self._graphs = dict()
+
     def stage_graph(self):
         """
-        :return: (networkx.DiGraph) a DAG of the stages
+        :return: (networkx.DiGraph) a DAG of the stages.  It is cached until :meth:`invalidate_graphs` is called, so
+            do not modify it.
         """
-        g = nx.DiGraph()
-        g.add_nodes_from(self.stages)
-        g.add_edges_from((s, c) for s in self.stages for c in s.children if c)
-        return g
+        if 'stage' not in self._graphs:
+            g = nx.DiGraph()
+            g.add_nodes_from(self.stages)
+            g.add_edges_from((s, c) for s in self.stages for c in s.children if c)
+            self._graphs['stage'] = g
+        return self._graphs['stage']
 
     def task_graph(self):
         """
-        :return: (networkx.DiGraph) a DAG of the tasks
+        :return: (networkx.DiGraph) a DAG of the tasks.  It is cached until :meth:`invalidate_graphs` is called, so
+            do not modify it.
+        """
+        if 'task' not in self._graphs:
+            g = nx.DiGraph()
+            g.add_nodes_from(self.tasks)
+            g.add_edges_from([(t, c) for t in self.tasks for c in t.children])
+            self._graphs['task'] = g
+        return self._graphs['task']
+
+
+    def expected_stage_runtimes(self):
+        """
+        :return: (dict) stage name -> the average wall_time of successful tasks in stages with that name, across all
+            executions in the database.
+        """
+        from .. import Stage
+
+        q = self.session.query(Stage.name, func.avg(Task.wall_time)).join(Task).filter(
+            Task.successful, Task.wall_time.isnot(None)).group_by(Stage.name)
+        return {name: float(wall_time) for name, wall_time in q}
+
+    def bulk_delete_unsuccessful_tasks(self):
+        """
+        Deletes this Execution's unsuccessful Tasks, then its Stages that have no Tasks left, with set based DELETEs.
+        Their TaskFiles, InputFileAssociations and TaskEdges are removed by the ON DELETE CASCADE foreign keys.  No
+        Tasks are loaded into the session.
+
+        :returns: (int, int) the number of Tasks and Stages deleted.
         """
-        g = nx.DiGraph()
-        g.add_nodes_from(self.tasks)
-        g.add_edges_from([(t, c) for t in self.tasks for c in t.children])
-        return g
+        from .. import Stage
 
+        stage_ids = self.session.query(Stage.id).filter(Stage.execution_id == self.id)
+        n_tasks = self.session.query(Task).filter(Task.stage_id.in_(stage_ids.subquery()), ~Task.successful).delete(
+            synchronize_session=False)
+        n_stages = self.session.query(Stage).filter(Stage.execution_id == self.id, ~Stage.tasks.any()).delete(
+            synchronize_session=False)
+        # anything already loaded may refer to deleted rows
+        self.session.expire_all()
+        return n_tasks, n_stages
 
     def get_stage(self, name_or_id):
         if isinstance(name_or_id, int):
@@ -496,59 +712,90 @@ def _run(execution, session, task_queue):
     Do the execution!
     """
     execution.log.info('Executing TaskGraph')
+    jobmanager = execution.jobmanager
 
+    stats = execution.run_stats
     available_cores = True
     while len(task_queue) > 0:
+        stats['passes'] += 1
         if available_cores:
-            _run_queued_and_ready_tasks(task_queue, execution)
+            with timed(stats, 'submit'):
+                _run_queued_and_ready_tasks(task_queue, execution)
             available_cores = False
 
-        for task in _process_finished_tasks(execution.jobmanager):
+        with timed(stats, 'process_finished'):
+            finished_tasks = _process_finished_tasks(jobmanager)
+        for task in finished_tasks:
             if task.status == TaskStatus.failed and task.must_succeed:
                 # pop all descendents when a task fails
-                task_queue.remove_nodes_from(descendants(task_queue, task))
-                task_queue.remove_node(task)
+                task_queue.failed(task)
                 execution.status = ExecutionStatus.failed_but_running
                 execution.log.info('%s tasks left in the queue' % len(task_queue))
             elif task.status == TaskStatus.successful:
                 # just pop this task
-                task_queue.remove_node(task)
+                task_queue.finished(task)
             elif task.status == TaskStatus.no_attempt:
                 # the task must have failed, and is being reattempted
-                pass
+                task_queue.requeue(task)
             else:
                 raise AssertionError('Unexpected finished task status %s for %s' % (task.status, task))
             available_cores = True
 
-        # only commit Task changes after processing a batch of finished ones
-        session.commit()
-        time.sleep(.3)
+        with timed(stats, 'commit'):
+            if available_cores:
+                # only commit Task changes after processing a batch of finished ones
+                execution.commit_or_defer()
+            execution.commit_deferred()
+
+        if not available_cores:
+            # nothing changed, block until a DRM pushes a finished task, it is time to poll the DRMs again, or
+            # written behind changes are due to be committed
+            timeout = jobmanager.poll_timeout
+            if execution.seconds_until_commit is not None:
+                timeout = min(timeout, execution.seconds_until_commit)
+            with timed(stats, 'wait'):
+                jobmanager.wait_for_finished_tasks(timeout)
+
+    for drm, latency in sorted(jobmanager.submit_latency.items()):
+        execution.log.info('Seconds to submit a job to %s: %s' % (drm, latency))
+    for drm, latency in sorted(jobmanager.poll_latency.items()):
+        execution.log.info('Seconds to poll %s for finished jobs: %s' % (drm, latency))
+
+    if execution.max_cpus is not None or execution.max_mem is not None:
+        execution.log.info('Time ready tasks spent waiting for resources: %s' % ', '.join(
+            '%s=%ss' % (resource, int(secs)) for resource, secs in sorted(task_queue.blocked_time.items())))
 
 
 def _run_queued_and_ready_tasks(task_queue, execution):
-    max_cpus = execution.max_cpus
-    ready_tasks = [task for task, degree in task_queue.in_degree().items() if
-                   degree == 0 and task.status == TaskStatus.no_attempt]
-    for ready_task in sorted(ready_tasks, key=lambda t: t.cpu_req):
-        cores_used = sum([t.cpu_req for t in execution.jobmanager.running_tasks])
-        if max_cpus is not None and ready_task.cpu_req + cores_used > max_cpus:
-            execution.log.info('Reached max_cpus limit of %s, waiting for a task to finish...' % max_cpus)
-            break
+    ready_tasks = list(task_queue.pop_ready_within(execution.max_cpus, execution.max_mem))
+    if ready_tasks:
+        execution.jobmanager.submit_tasks(ready_tasks)
+    submitted = bool(ready_tasks)
 
-        execution.jobmanager.submit(ready_task)
+    if task_queue.num_blocked:
+        execution.log.info('%s ready task(s) waiting for cores (max_cpus=%s) or memory (max_mem=%s) to free up...' % (
+            task_queue.num_blocked, execution.max_cpus, execution.max_mem))
 
     # only commit submitted Tasks after submitting a batch
-    execution.session.commit()
+    if submitted:
+        execution.commit_or_defer()
 
 
 def _process_finished_tasks(jobmanager):
+    """
+    Sets the status of finished Tasks, a batch at a time.
+
+    :returns: (list) the finished Tasks.
+    """
+    successful, failed = [], []
     for task in jobmanager.get_finished_tasks():
-        if task.NOOP or task.profile.get('exit_status', None) == 0:
-            task.status = TaskStatus.successful
-            yield task
+        if task.NOOP or task.exit_status == 0:
+            successful.append(task)
         else:
-            task.status = TaskStatus.failed
-            yield task
+            failed.append(task)
+    set_task_statuses(successful, TaskStatus.successful)
+    set_task_statuses(failed, TaskStatus.failed)
+    return successful + failed
 
 
 def handle_exits(execution, do_atexit=True):
@@ -557,6 +804,7 @@ def handle_exits(execution, do_atexit=True):
         if not execution.successful:
             execution.log.info('Caught SIGINT (ctrl+c)')
             execution.terminate(due_to_failure=False)
+            execution.commit_deferred(force=True)
             raise SystemExit('Execution terminated with a SIGINT (ctrl+c) event')
 
     signal.signal(signal.SIGINT, ctrl_c)
@@ -568,6 +816,7 @@ def handle_exits(execution, do_atexit=True):
                 execution.log.error('Execution %s has a status of running atexit!' % execution)
                 execution.terminate(due_to_failure=True)
                 # raise SystemExit('Execution terminated due to the python interpreter exiting')
+            execution.commit_deferred(force=True)
 
 
 def _copy_graph(graph):
@@ -1,8 +1,10 @@
 import re
+from collections import Counter
 from sqlalchemy.schema import Column, ForeignKey, UniqueConstraint
 from sqlalchemy.types import Boolean, Integer, String, DateTime
 from sqlalchemy.orm import relationship, synonym, backref, validates
 from sqlalchemy.ext.declarative import declared_attr
+from sqlalchemy.sql.expression import func
 from flask import url_for
 
 from ..db import Base
@@ -14,7 +16,7 @@ import datetime
 
 @signal_stage_status_change.connect
 def task_status_changed(stage):
-    stage.log.info('%s %s (%s tasks)' % (stage, stage.status, len(stage.tasks)))
+    stage.log.info('%s %s (%s tasks)' % (stage, stage.status, stage.task_counts['total']))
     if stage.status == StageStatus.successful:
         stage.successful = True
 
@@ -23,7 +25,7 @@ def task_status_changed(stage):
     elif stage.status in [StageStatus.successful, StageStatus.failed, StageStatus.killed]:
         stage.finished_on = datetime.datetime.now()
 
-    stage.session.commit()
+    stage.execution.commit_or_defer()
 
 
 class StageEdge(Base):
@@ -100,16 +102,67 @@ class Stage(Base):
 
         return self.session.query(Task)
 
+    # TaskStatus -> the number of this Stage's Tasks with that status, and the same for only the Tasks that must
+    # succeed.  Loaded on first use, then kept up to date as Task statuses change.
+    _task_counts = None
+    _required_task_counts = None
+
+    def _load_task_counts(self):
+        from .. import Task
+
+        if 'tasks' in self.__dict__ or self.id is None:
+            # already in memory
+            rows = Counter((t.status or TaskStatus.no_attempt, t.must_succeed is not False) for t in self.tasks).items()
+        else:
+            q = self.session.query(Task._status, Task.must_succeed, func.count(Task.id)).filter(
+                Task.stage_id == self.id).group_by(Task._status, Task.must_succeed)
+            rows = [((status, must_succeed is not False), n) for status, must_succeed, n in q]
+
+        self._task_counts, self._required_task_counts = Counter(), Counter()
+        for (status, must_succeed), n in rows:
+            self._task_counts[status] += n
+            if must_succeed:
+                self._required_task_counts[status] += n
+
+    def reset_task_counts(self):
+        """
+        Reloads :attr:`task_counts` next time it is used.  Call after adding Tasks to or deleting Tasks from this Stage.
+        """
+        self._task_counts = self._required_task_counts = None
+
+    def _task_status_changed(self, task, old_status, new_status):
+        """Called by Task when its status changes"""
+        if self._task_counts is not None:
+            old_status = old_status or TaskStatus.no_attempt
+            self._task_counts[old_status] -= 1
+            self._task_counts[new_status] += 1
+            if task.must_succeed is not False:
+                self._required_task_counts[old_status] -= 1
+                self._required_task_counts[new_status] += 1
+
+    @property
+    def task_counts(self):
+        """
+        :returns: (dict) The number of this Stage's Tasks in `total`, and that are `successful`, `failed` or `running`
+            (waiting or submitted).  `remaining` is the number of Tasks that must succeed but have not yet.
+        """
+        if self._task_counts is None:
+            self._load_task_counts()
+        c, r = self._task_counts, self._required_task_counts
+        return dict(total=sum(c.values()),
+                    successful=c[TaskStatus.successful],
+                    failed=c[TaskStatus.failed],
+                    running=c[TaskStatus.waiting] + c[TaskStatus.submitted],
+                    remaining=sum(r.values()) - r[TaskStatus.successful])
+
     def num_tasks(self):
-        return self.tasksq.count()
+        return self.task_counts['total']
 
     def num_successful_tasks(self):
-        return self.tasksq.filter_by(stage=self, successful=True).count()
-        # return len(filter(lambda t: t.successful, self.tasks))
+        return self.task_counts['successful']
 
     def num_failed_tasks(self):
-        return self.tasksq.filter_by(stage=self, status=TaskStatus.failed).count()
-        # return len(filter(lambda t: t.status == TaskStatus.failed, self.tasks))
+        return self.task_counts['failed']
 
 
     @property
@@ -136,6 +189,7 @@ class Stage(Base):
         if delete_files:
             for t in self.tasks:
                 t.delete(delete_files=True)
+        self.execution.invalidate_graphs()
         self.session.delete(self)
         self.session.commit()
 
@@ -149,14 +203,13 @@ class Stage(Base):
         return tasks[0]
 
     def percent_successful(self):
-        return round(float(self.num_successful_tasks()) / (float(len(self.tasks)) or 1) * 100, 2)
+        return round(float(self.num_successful_tasks()) / (float(self.num_tasks()) or 1) * 100, 2)
 
     def percent_failed(self):
-        return round(float(self.num_failed_tasks()) / (float(len(self.tasks)) or 1) * 100, 2)
+        return round(float(self.num_failed_tasks()) / (float(self.num_tasks()) or 1) * 100, 2)
 
     def percent_running(self):
-        return round(float(len([t for t in self.tasks if t.status == TaskStatus.submitted])) / (
-            float(len(self.tasks)) or 1) * 100, 2)
+        return round(float(self.task_counts['running']) / (float(self.num_tasks()) or 1) * 100, 2)
 
     def descendants(self, include_self=False):
         """
@@ -171,7 +224,7 @@ class Stage(Base):
 
     @property
     def label(self):
-        return '{0} ({1}/{2})'.format(self.name, self.num_successful_tasks(), len(self.tasks))
+        return '{0} ({1}/{2})'.format(self.name, self.num_successful_tasks(), self.num_tasks())
 
     def __repr__(self):
         return '<Stage[%s] %s>' % (self.id or '', self.name)
@@ -16,8 +16,9 @@ from networkx.algorithms import breadth_first_search
 from ..db import Base
 from ..util.sqla import Enum34_ColumnType, MutableDict, JSONEncodedDict
 from sqlalchemy_utils.types.json import JSONType
-from .. import TaskStatus, StageStatus, signal_task_status_change
+from .. import TaskStatus, StageStatus, signal_task_status_change, signal_tasks_status_change
 from ..util.helpers import wait_for_file
+from ..util.iterstuff import unique_everseen
 from .TaskFile import InputFileAssociation
 import datetime
 
@@ -49,8 +50,8 @@ task_failed_printout = u"""Failure Info:
 Failed Task.output_dir: {0.output_dir}"""
 
 
-@signal_task_status_change.connect
-def task_status_changed(task):
+def _task_status_changed(task):
+    """Updates `task` after its status changed"""
     if task.status in [TaskStatus.successful]:
         if not task.NOOP:
             task.log.info('%s %s' % (task, task.status))
@@ -59,9 +60,8 @@ def task_status_changed(task):
         task.started_on = datetime.datetime.now()
 
     elif task.status == TaskStatus.submitted:
-        task.stage.status = StageStatus.running
         if not task.NOOP:
-            task.log.info('%s %s. drm=%s; drm_jobid=%s' % (task, task.status, task.drm, task.drm_jobID))
+            task.log.info('%s %s. drm=%s; drm_jobid=%s' % (task, task.status, task.drm, task.drm_job_key))
         task.submitted_on = datetime.datetime.now()
 
     elif task.status == TaskStatus.failed:
@@ -87,10 +87,46 @@ def task_status_changed(task):
     elif task.status == TaskStatus.successful:
         task.successful = True
         task.finished_on = datetime.datetime.now()
-        if all(t.successful or not t.must_succeed for t in task.stage.tasks):
-            task.stage.status = StageStatus.successful
 
-            # task.session.commit()
+
+def _stage_tasks_status_changed(stage, status):
+    """Updates `stage` after some of its Tasks changed to `status`"""
+    if status == TaskStatus.submitted:
+        stage.status = StageStatus.running
+    elif status == TaskStatus.successful:
+        if stage.task_counts['remaining'] == 0:
+            stage.status = StageStatus.successful
+
+
+@signal_task_status_change.connect
+def task_status_changed(task):
+    status = task.status
+    _task_status_changed(task)
+    _stage_tasks_status_changed(task.stage, status)
+
+
+@signal_tasks_status_change.connect
+def tasks_status_changed(tasks, status):
+    for task in tasks:
+        _task_status_changed(task)
+    for stage in unique_everseen(task.stage for task in tasks):
+        _stage_tasks_status_changed(stage, status)
+
+
+def set_task_statuses(tasks, status):
+    """
+    Sets the status of many Tasks at once.  Sends one signal_tasks_status_change for the batch rather than a
+    signal_task_status_change per Task, so the work done for each Stage only happens once per batch.
+
+    :param list tasks: Tasks.
+    :param TaskStatus status: The new status.
+    """
+    tasks = [t for t in tasks if t.status != status]
+    for task in tasks:
+        task.stage._task_status_changed(task, task._status, status)
+        task._status = status
+    if tasks:
+        signal_tasks_status_change.send(tasks, status=status)
 
 
 # task_edge_table = Table('task_edge', Base.metadata,
@@ -157,6 +193,11 @@ class Task(Base):
     finished_on = Column(DateTime)
     attempt = Column(Integer, default=1)
     must_succeed = Column(Boolean, default=True)
+    skip_profile = Column(Boolean, default=False)
+    #: Comma separated reqs the ResourceAdvisor predicts from past Tasks of the stage, see Tool.predict_reqs
+    predict_reqs = Column(String(255))
+    #: The summed size of the input files when the Task became ready, recorded for Tasks with predict_reqs
+    input_size_kb = Column(BigInteger)
     drm = Column(String(255), nullable=False)
     parents = relationship("Task",
                            secondary=TaskEdge.__table__,
@@ -171,15 +212,29 @@ class Task(Base):
                                 passive_deletes=True)
     _input_file_assocs = relationship("InputFileAssociation", backref=backref("task"), cascade="all, delete-orphan",
                                       passive_deletes=True)
-    # command = Column(Text)
+    #: The rendered command, for Tasks that were added without keeping their Tool around (see Execution.add)
+    command = Column(Text)
 
     @property
     def input_files(self):
         # todo this should be an assoc proxy?
         return [ifa.taskfile for ifa in self._input_file_assocs]
 
+    @property
+    def predicted_reqs(self):
+        return self.predict_reqs.split(',') if self.predict_reqs else []
+
     drm_native_specification = Column(String(255))
     drm_jobID = Column(Integer)
+    #: The Task's (1-based) element of the array job drm_jobID, or None if it was submitted as its own job
+    drm_array_index = Column(Integer)
+
+    @property
+    def drm_job_key(self):
+        """drm_jobID, or `drm_jobID[drm_array_index]` for an element of an array job"""
+        if self.drm_array_index is None:
+            return self.drm_jobID
+        return '%s[%s]' % (self.drm_jobID, self.drm_array_index)
 
     profile_fields = ['wall_time', 'cpu_time', 'percent_cpu', 'user_time', 'system_time', 'io_read_count',
                       'io_write_count', 'io_read_kb', 'io_write_kb',
@@ -224,6 +279,7 @@ class Task(Base):
 
         def set_status(self, value):
             if self._status != value:
+                self.stage._task_status_changed(self, self._status, value)
                 self._status = value
                 signal_task_status_change.send(self)
 
@@ -258,9 +314,9 @@ class Task(Base):
         r = readfile(self.output_stderr_path).strip()
         if r == 'file does not exist':
             if self.drm == 'lsf' and self.drm_jobID:
-                r += '\n\nbpeek %s output:\n\n' % self.drm_jobID
+                r += '\n\nbpeek %s output:\n\n' % self.drm_job_key
                 try:
-                    r += codecs.decode(sp.check_output('bpeek %s' % self.drm_jobID, shell=True), 'utf-8')
+                    r += codecs.decode(sp.check_output('bpeek "%s"' % self.drm_job_key, shell=True), 'utf-8')
                 except Exception as e:
                     r += str(e)
         return r
@@ -301,7 +357,8 @@ class Task(Base):
         """
         :return: (list) all tasks that descend from this task in the task_graph
         """
-        d = breadth_first_search.bfs_predecessors(self.execution.task_graph().reverse(copy=False), self)
+        # walk the edges backwards rather than reversing the graph, which is cached by the execution
+        d = {v: u for u, v in breadth_first_search.bfs_edges(self.execution.task_graph(), self, reverse=True)}
         if as_dict:
             return d
         return set(d.values())
@@ -327,6 +384,8 @@ class Task(Base):
 
     def delete(self, delete_files=False):
         self.log.debug('Deleting %s' % self)
+        self.execution.invalidate_graphs()
+        self.stage.reset_task_counts()
         if delete_files:
             for tf in self.output_files:
                 tf.delete(True)
@@ -72,6 +72,10 @@ class Tool(object):
     persist = False
     drm = None
     skip_profile = False
+    #: True, or a list of 'cpu_req', 'mem_req' and 'time_req', to have those reqs predicted from the resource usage
+    #: of past Tasks of the stage when a Task becomes ready (see Execution.run).  The reqs above are used until there
+    #: are enough past Tasks.
+    predict_reqs = False
     inputs = []  # class property!
     outputs = []  # class property!
     output_dir = None
@@ -200,6 +204,9 @@ class Tool(object):
         self.output_dir = os.path.join(stage.execution.output_dir, self.output_dir)
         d = {attr: getattr(self, attr) for attr in ['mem_req', 'time_req', 'cpu_req', 'must_succeed']}
         d['drm'] = 'local' if self.drm is not None else default_drm
+        predict_reqs = ['cpu_req', 'mem_req', 'time_req'] if self.predict_reqs is True else self.predict_reqs or []
+        assert set(predict_reqs) <= {'cpu_req', 'mem_req', 'time_req'}, 'invalid predict_reqs %s' % predict_reqs
+        d['predict_reqs'] = ','.join(predict_reqs) or None
 
         aif_2_input_taskfiles = OrderedDict(self._map_inputs(parents))
 
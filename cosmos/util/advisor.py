@@ -0,0 +1,116 @@
+import math
+import os
+
+#: req -> (the profile field it is predicted from, the field's units per unit of the req, whether the margin applies)
+REQS = {'cpu_req': ('percent_cpu', 100.0, False),
+        'mem_req': ('max_rss_mem_kb', 1024.0, True),
+        'time_req': ('wall_time', 60.0, True)}
+
+
+def quantile(values, q):
+    """
+    :returns: The nearest-rank `q` quantile of `values`.
+    """
+    values = sorted(values)
+    return values[min(len(values) - 1, int(math.ceil(q * len(values))) - 1)] if values else None
+
+
+class StageModel(object):
+    """
+    Predicts a profile field of a stage's Tasks as the `q` quantile of past Tasks, or, when regressed, as a least
+    squares line on the summed size of their input files, shifted up by the `q` quantile of its residuals.
+    """
+
+    def __init__(self, samples, q, regress=False, min_samples=5):
+        """
+        :param samples: [(input_size_kb or None, value), ...]
+        """
+        self.n = len(samples)
+        self.slope = 0.0
+        self.intercept = quantile([y for _, y in samples], q)
+        sized = [(x, y) for x, y in samples if x is not None]
+        if regress and len(sized) >= min_samples:
+            mean_x = sum(x for x, _ in sized) / float(len(sized))
+            mean_y = sum(y for _, y in sized) / float(len(sized))
+            var_x = sum((x - mean_x) ** 2 for x, _ in sized)
+            if var_x > 0:
+                self.slope = sum((x - mean_x) * (y - mean_y) for x, y in sized) / var_x
+                line = mean_y - self.slope * mean_x
+                self.intercept = line + quantile([y - line - self.slope * x for x, y in sized], q)
+
+    def predict(self, input_size_kb=None):
+        return max(0.0, self.intercept + self.slope * (input_size_kb or 0))
+
+
+class ResourceAdvisor(object):
+    """
+    Predicts the cpu_req, mem_req and time_req of Tasks whose Tool sets `predict_reqs`, from the profiles of the
+    successful Tasks of stages with the same name in the database.  Models are fit once per stage name.
+    """
+
+    def __init__(self, session, q=.95, margin=1.2, min_samples=5, max_samples=1000, regress=False, max_cpus=None,
+                 max_mem=None, log=None):
+        """
+        :param q: The quantile of past usage that is requested.
+        :param margin: The factor mem_req and time_req are padded by.
+        :param min_samples: The fewest past Tasks a prediction is made from.  Tasks of stages with fewer keep their
+            Tool's reqs.
+        :param max_samples: The most recent past Tasks of a stage that are used.
+        :param regress: If True, regress on the summed size of each Task's input files.
+        :param max_cpus: The most cpu_req predicted, ie. the Execution's max_cpus.
+        :param max_mem: The most mem_req predicted, ie. the Execution's max_mem.
+        """
+        self.session = session
+        self.q = q
+        self.margin = margin
+        self.min_samples = min_samples
+        self.max_samples = max_samples
+        self.regress = regress
+        self.max_cpus = max_cpus
+        self.max_mem = max_mem
+        self.log = log
+        self._models = dict()  # stage name -> {req: StageModel}
+
+    def models(self, stage_name):
+        """
+        :returns: (dict) req -> StageModel, for the reqs with at least `min_samples` past Tasks.
+        """
+        if stage_name not in self._models:
+            from .. import Task, Stage
+
+            fields = [REQS[req][0] for req in sorted(REQS)]
+            with self.session.no_autoflush:
+                rows = self.session.query(Task.input_size_kb, *[getattr(Task, f) for f in fields]).join(Stage).filter(
+                    Stage.name == stage_name, Task.successful).order_by(Task.id.desc()).limit(self.max_samples).all()
+            models = dict()
+            for i, req in enumerate(sorted(REQS)):
+                samples = [(row[0], row[i + 1]) for row in rows if row[i + 1] is not None]
+                if len(samples) >= self.min_samples:
+                    models[req] = StageModel(samples, self.q, self.regress, self.min_samples)
+            self._models[stage_name] = models
+            if models and self.log:
+                self.log.info('Predicting %s of %s tasks from %s past tasks' % (
+                    ', '.join(sorted(models)), stage_name, max(m.n for m in models.values())))
+        return self._models[stage_name]
+
+    def advise(self, task):
+        """
+        Sets the reqs `task`'s Tool asked to have predicted.
+        """
+        reqs = task.predicted_reqs
+        if not reqs or task.NOOP:
+            return
+        # recorded even when not regressing, so later executions can regress on it
+        task.input_size_kb = sum(os.path.getsize(tf.path) for tf in task.input_files
+                                 if os.path.exists(tf.path)) // 1024
+        models = self.models(task.stage.name)
+        for req in reqs:
+            if req in models:
+                field, units, padded = REQS[req]
+                value = models[req].predict(task.input_size_kb) / units * (self.margin if padded else 1)
+                value = max(1, int(math.ceil(value)))
+                if req == 'cpu_req' and self.max_cpus is not None:
+                    value = min(value, self.max_cpus)
+                if req == 'mem_req' and self.max_mem is not None:
+                    value = min(value, self.max_mem)
+                setattr(task, req, value)
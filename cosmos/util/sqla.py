@@ -1,4 +1,8 @@
+import time
+from array import array
 import sqlalchemy.types as types
+from sqlalchemy import inspect, func
+from sqlalchemy.orm import make_transient_to_detached
 from sqlalchemy.ext.mutable import Mutable
 import six
 
@@ -104,4 +108,154 @@ class MutableDict(Mutable, dict):
         "Detect dictionary del events and emit change events."
 
         dict.__delitem__(self, key)
-        self.changed()
\ No newline at end of file
+        self.changed()
+
+def bulk_insert_new(session, log=None):
+    """
+    Persists every pending object in `session` with one executemany INSERT per table, instead of a unit of work
+    flush.  Integer primary keys are assigned in blocks after the current max id of each table, foreign keys are
+    copied from many-to-one relationships, and rows for many-to-many association tables are built from the
+    relationship collections.  The objects are then attached to `session` as if they had been loaded from the
+    database, so they keep their in-memory relationships and ids without a flush.
+
+    Only scalar column defaults are applied.  Assumes nothing else is inserting into the same tables concurrently.
+
+    :param sqlalchemy.orm.Session session: the session.
+    :param logging.Logger log: if set, the number of rows and time spent inserting into each table is logged.
+    """
+    new = sorted(session.new, key=lambda obj: inspect(obj).insert_order)
+    if not new:
+        return
+    # an autoflush would persist the objects through the unit of work before they are inserted here
+    with session.no_autoflush:
+        _bulk_insert(session, new, log)
+
+
+def _bulk_insert(session, new, log):
+    is_new = set(new)
+    rows = dict()  # Table -> list of rows
+
+    def value_of(obj, column):
+        return getattr(obj, inspect(obj).mapper.get_property_by_column(column).key)
+
+    def is_autoincrement(table):
+        pks = list(table.primary_key.columns)
+        return len(pks) == 1 and pks[0].autoincrement and isinstance(pks[0].type, types.Integer)
+
+    # assign primary keys in blocks
+    by_mapper = dict()
+    for obj in new:
+        by_mapper.setdefault(inspect(obj).mapper, []).append(obj)
+    for mapper, objs in by_mapper.items():
+        if is_autoincrement(mapper.local_table):
+            pk = mapper.primary_key[0]
+            key = mapper.get_property_by_column(pk).key
+            next_id = (session.query(func.max(pk)).scalar() or 0) + 1
+            for obj in objs:
+                if getattr(obj, key) is None:
+                    setattr(obj, key, next_id)
+                    next_id += 1
+
+    def add_secondary_rows(obj, rel, others):
+        for other in others:
+            row = {r.key: value_of(obj, l) for l, r in rel.synchronize_pairs}
+            row.update((r.key, value_of(other, l)) for l, r in rel.secondary_synchronize_pairs)
+            rows.setdefault(rel.secondary, set()).add(tuple(sorted(row.items())))
+
+    # build rows, copying foreign keys and filling in column defaults
+    for obj in new:
+        mapper = inspect(obj).mapper
+        for rel in mapper.relationships:
+            if rel.secondary is not None:
+                add_secondary_rows(obj, rel, obj.__dict__.get(rel.key, []))
+            elif rel.direction.name == 'MANYTOONE':
+                related = obj.__dict__.get(rel.key)
+                if related is not None:
+                    for local, remote in rel.local_remote_pairs:
+                        setattr(obj, mapper.get_property_by_column(local).key, value_of(related, remote))
+
+        row = dict()
+        for prop in mapper.column_attrs:
+            column = prop.columns[0]
+            if column.table is not mapper.local_table:
+                continue
+            value = obj.__dict__.get(prop.key)
+            if value is None and column.default is not None and column.default.is_scalar:
+                value = column.default.arg
+                setattr(obj, prop.key, value)
+            row[column.key] = value
+        rows.setdefault(mapper.local_table, []).append(row)
+
+    # persistent objects that gained many-to-many links; those links are inserted here rather than by the next flush
+    persistent = set(session.dirty)
+    for obj in new:
+        for rel in inspect(obj).mapper.relationships:
+            if rel.secondary is not None:
+                persistent.update(o for o in obj.__dict__.get(rel.key, []) if o not in is_new)
+    expire = []
+    for obj in persistent:
+        state = inspect(obj)
+        m2m_keys = [rel.key for rel in state.mapper.relationships if rel.secondary is not None]
+        for key in m2m_keys:
+            history = state.attrs[key].history
+            assert not history.deleted, 'cannot bulk insert while %s.%s has pending deletes' % (obj, key)
+            add_secondary_rows(obj, state.mapper.relationships[key], history.added or ())
+        if m2m_keys:
+            expire.append((obj, m2m_keys))
+
+    dialect = session.get_bind().dialect.name
+    metadata = inspect(new[0]).mapper.local_table.metadata
+    for table in (t for t in metadata.sorted_tables if t in rows):
+        table_rows = [dict(r) if isinstance(r, tuple) else r for r in rows[table]]
+        start = time.time()
+        session.execute(table.insert(), table_rows)
+        if dialect == 'postgresql' and is_autoincrement(table):
+            # move the sequence past the ids that were assigned here
+            pk = list(table.primary_key.columns)[0].name
+            session.execute("SELECT setval(pg_get_serial_sequence('{0}', '{1}'), (SELECT max({1}) FROM {0}))".format(
+                table.name, pk))
+        if log:
+            log.info('Inserted %s rows into `%s` in %.2fs' % (len(table_rows), table.name, time.time() - start))
+
+    for obj in new:
+        if obj in session:
+            session.expunge(obj)
+    for obj in new:
+        make_transient_to_detached(obj)
+    session.add_all(new)
+    for obj, keys in expire:
+        session.expire(obj, keys)
+
+
+class LazyInstanceList(object):
+    """
+    A read-only list of `model` instances that only keeps their primary keys in memory.  Instances are loaded from
+    `session` as they are accessed, in batches of `batch_size` when iterating.
+    """
+
+    def __init__(self, session, model, ids=(), batch_size=1000):
+        self.session = session
+        self.model = model
+        self.ids = array('l', ids)
+        self.batch_size = batch_size
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return LazyInstanceList(self.session, self.model, self.ids[index], self.batch_size)
+        return self.session.query(self.model).get(self.ids[index])
+
+    def __iter__(self):
+        mapper = inspect(self.model)
+        pk = mapper.primary_key[0]
+        key = mapper.get_property_by_column(pk).key
+        for i in xrange(0, len(self.ids), self.batch_size):
+            batch = self.ids[i:i + self.batch_size]
+            instances = {getattr(obj, key): obj for obj in self.session.query(self.model).filter(pk.in_(batch))}
+            for id_ in batch:
+                yield instances[id_]
+
+    def __repr__(self):
+        return '<LazyInstanceList of %s %s>' % (len(self), self.model.__name__)
@@ -0,0 +1,55 @@
+import bisect
+import time
+from contextlib import contextmanager
+
+
+class Histogram(object):
+    """
+    Counts values into fixed buckets, ie. to keep track of a distribution of latencies without storing every value.
+    """
+
+    def __init__(self, bounds=(.1, .25, .5, 1, 2, 5, 10, 30, 60)):
+        """
+        :param bounds: Upper bounds of the buckets, in increasing order.  Values larger than the last bound are
+            counted in an extra overflow bucket.
+        """
+        self.bounds = list(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = None
+
+    def add(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = value if self.max is None else max(self.max, value)
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    def buckets(self):
+        """
+        :returns: [(label, count), ...] for each bucket
+        """
+        labels = ['<=%s' % b for b in self.bounds] + ['>%s' % self.bounds[-1]]
+        return zip(labels, self.counts)
+
+    def __str__(self):
+        if not self.count:
+            return 'n=0'
+        return 'n=%s mean=%.3f max=%.3f %s' % (self.count, self.mean, self.max,
+                                              ' '.join('%s:%s' % (l, c) for l, c in self.buckets() if c))
+
+
+@contextmanager
+def timed(counter, key):
+    """
+    Adds the seconds spent in the with block to `counter[key]`.
+    """
+    start = time.time()
+    try:
+        yield
+    finally:
+        counter[key] += time.time() - start
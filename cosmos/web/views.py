@@ -107,10 +107,12 @@ def gen_bprint(cosmos_app):
         ex = get_execution(id)
 
         if pygraphviz_available:
+            # the layout is only recomputed when tasks or stages were added or deleted
+            cache_key = (ex.id, ex.graph_version)
             if type == 'task':
-                svg = Markup(draw_task_graph(ex.task_graph()))
+                svg = Markup(draw_task_graph(ex.task_graph(), cache_key=cache_key))
             else:
-                svg = Markup(draw_stage_graph(ex.stage_graph(), url=True))
+                svg = Markup(draw_stage_graph(ex.stage_graph(), url=True, cache_key=cache_key))
         else:
             svg = 'Pygraphviz not installed, cannot visualize'
 